@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize comment text so copies that only differ in whitespace or unicode form share an entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class AnalysisCache:
+    """Content-addressed cache of comment analyses.
+
+    An in-memory LRU sits in front of a size-bounded SQLite table. Entries are keyed by
+    hash(namespace, normalized text), where the namespace identifies the model, prompt version
+    and decoding mode. Opening the cache with a different namespace drops the old entries,
+    since they can never be hit again.
+    """
+
+    def __init__(self, path, namespace, max_memory_entries=10000, max_disk_entries=500000):
+        self.namespace = namespace
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory = OrderedDict()  # key -> JSON string, least recently used first
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)")
+        self.db.execute("DELETE FROM analyses WHERE namespace != ?", (namespace,))
+        self.db.commit()
+        self.disk_entries = self.db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.namespace}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        """Return {text: analysis} for every text that is cached (each value is a fresh copy)."""
+        found = {}
+        now = time.time()
+        with self.lock:
+            pending = {}  # key -> texts that normalize to it
+            for text in texts:
+                if text in found:
+                    continue
+                key = self.key(text)
+                result = self.memory.get(key)
+                if result is not None:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    found[text] = json.loads(result)
+                elif text not in pending.setdefault(key, []):
+                    pending[key].append(text)
+
+            for key, key_texts in pending.items():
+                row = self.db.execute("SELECT result FROM analyses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    continue
+                self.disk_hits += 1
+                self._remember(key, row[0])
+                for text in key_texts:
+                    found[text] = json.loads(row[0])
+                self.db.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+        return found
+
+    def put_many(self, items):
+        """Store (text, analysis) pairs in both tiers, evicting the least recently used rows on disk."""
+        now = time.time()
+        with self.lock:
+            for text, analysis in items:
+                key, result = self.key(text), json.dumps(analysis)
+                self._remember(key, result)
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO analyses (key, namespace, result, last_used) VALUES (?, ?, ?, ?)",
+                    (key, self.namespace, result, now))
+                if cursor.rowcount:
+                    self.disk_entries += 1
+                else:
+                    self.db.execute("UPDATE analyses SET result = ?, last_used = ? WHERE key = ?", (result, now, key))
+
+            overflow = self.disk_entries - self.max_disk_entries
+            if overflow > 0:
+                self.db.execute(
+                    "DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY last_used LIMIT ?)",
+                    (overflow,))
+                self.disk_entries -= overflow
+            self.db.commit()
+
+    def _remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters and current sizes of both tiers."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk_entries,
+        }
@@ -0,0 +1,291 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from categories import THEME_CATEGORIES
+from columnar import write_table
+from dataprocess import DataProcessor
+from vader_analysis import label_sentiment
+
+# Words the synthetic comments are made of: game terms mixed with everyday filler
+VOCABULARY = (
+    "evo card deck elixir tower king princess knight mega hog rider balloon golem witch wizard arrows "
+    "fireball log zap goblin barrel miner giant pekka skeleton bats musketeer valkyrie prince ladder "
+    "trophies ranked season pass gems gold chest emote update nerf buff bug crash lag matchmaking "
+    "level cards upgrade shop offer price event challenge clan war tournament replay opponent "
+    "game play think really still every time need good better worse broken unfair love hate fun "
+    "please fix make back again never always win lose lost won match battle friend people"
+).split()
+
+# Methods timed for every dataset size, with the arguments the API endpoints use by default
+METHODS = {
+    "get_trending_topics": lambda processor: processor.get_trending_topics(limit=30),
+    "get_sentiment_over_time": lambda processor: processor.get_sentiment_over_time(time_period='day'),
+    "get_sentiment_over_time_hour": lambda processor: processor.get_sentiment_over_time(time_period='hour'),
+    "get_top_comments": lambda processor: processor.get_top_comments(limit=50),
+    "get_top_comments_sentiment": lambda processor: processor.get_top_comments(limit=50, sort_by='sentiment'),
+    "get_theme_distribution": lambda processor: processor.get_theme_distribution(),
+    "get_developer_insights": lambda processor: processor.get_developer_insights(),
+    "generate_wordcloud": lambda processor: processor.generate_wordcloud(width=800, height=400),
+}
+
+# API requests timed through the whole endpoint path: response cache, encoding, compression and source filter
+ENDPOINTS = {
+    "trending-topics": ("/api/trending-topics", {}),
+    "sentiment-over-time": ("/api/sentiment-over-time?period=day", {}),
+    "sentiment-over-time-hour": ("/api/sentiment-over-time?period=hour", {"Accept-Encoding": "gzip"}),
+    "top-comments": ("/api/top-comments?limit=50", {}),
+    "top-comments-gzip": ("/api/top-comments?limit=50", {"Accept-Encoding": "gzip"}),
+    "top-comments-br-ndjson": ("/api/top-comments?limit=50&format=ndjson", {"Accept-Encoding": "br"}),
+    "top-comments-arrow": ("/api/top-comments?limit=50&format=arrow", {}),
+    "top-comments-filtered": ("/api/top-comments?limit=50&sort_by=sentiment&sentiment=negative&source=ClashRoyale", {}),
+    "theme-distribution": ("/api/theme-distribution", {}),
+    "developer-insights": ("/api/developer-insights?source=ClashRoyale", {"Accept-Encoding": "gzip"}),
+    "wordcloud-png": ("/api/wordcloud?format=png", {}),
+}
+
+
+def generate_dataset(comment_count, comments_per_post=50, themed_fraction=0.5, distinct_bodies=20_000, seed=0):
+    """Synthetic posts, comments and analysis DataFrames with the columns RedditScraper and
+    vader_analysis produce. themed_fraction of the analysis rows get themes and a summary, as
+    the LLM would add; the rest look like plain VADER output."""
+    rng = np.random.default_rng(seed)
+    post_count = max(1, comment_count // comments_per_post)
+    start = pd.Timestamp("2025-01-01")
+    span_seconds = 90 * 24 * 3600
+
+    post_ids = np.char.add("p", np.arange(post_count).astype(str))
+    posts = pd.DataFrame({
+        'id': post_ids,
+        'title': _bodies(rng, post_count, min(post_count, distinct_bodies), 4, 12),
+        'score': rng.zipf(1.6, post_count).clip(max=100_000),
+        'num_comments': np.bincount(rng.integers(0, post_count, comment_count), minlength=post_count),
+        'created_utc': start + pd.to_timedelta(rng.integers(0, span_seconds, post_count), unit='s'),
+        'url': np.char.add("https://www.reddit.com/r/ClashRoyale/comments/", post_ids),
+        'selftext': _bodies(rng, post_count, min(post_count, distinct_bodies), 0, 60),
+        'upvote_ratio': rng.uniform(0.5, 1.0, post_count).round(2),
+    })
+
+    comment_ids = np.char.add("c", np.arange(comment_count).astype(str))
+    post_of_comment = post_ids[rng.integers(0, post_count, comment_count)]
+    depth = rng.geometric(0.6, comment_count) - 1
+    parents = np.where(depth == 0, np.char.add("t3_", post_of_comment),
+                       np.char.add("t1_", comment_ids[rng.integers(0, comment_count, comment_count)]))
+    comments = pd.DataFrame({
+        'id': comment_ids,
+        'parent_id': parents,
+        'body': _bodies(rng, comment_count, distinct_bodies, 3, 40),
+        'score': rng.zipf(1.8, comment_count).clip(max=50_000) - rng.integers(0, 3, comment_count),
+        'created_utc': start + pd.to_timedelta(rng.integers(0, span_seconds, comment_count), unit='s'),
+        'depth': depth,
+        'post_id': post_of_comment,
+    })
+
+    compound = rng.uniform(-1, 1, comment_count).round(4)
+    themed = rng.random(comment_count) < themed_fraction
+    theme_sets = ["[]"] + [str([str(theme) for theme in rng.choice(THEME_CATEGORIES, size, replace=False)])
+                           for size in rng.integers(1, 4, 256)]
+    analysis = pd.DataFrame({
+        'comment_id': comment_ids,
+        'sentiment_score': compound,
+        'sentiment': label_sentiment(compound),
+        'themes': np.where(themed, np.array(theme_sets, dtype=object)[rng.integers(1, 257, comment_count)], "[]"),
+        'summary': np.where(themed, "Player feedback about the game.", ""),
+    })
+    return posts, comments, analysis
+
+
+def _bodies(rng, count, distinct, min_words, max_words):
+    """count texts drawn from a pool of distinct random texts, so repeats occur as in real threads."""
+    lengths = rng.integers(min_words, max_words + 1, distinct)
+    words = np.array(VOCABULARY, dtype=object)[rng.integers(0, len(VOCABULARY), lengths.sum())]
+    pool = np.array([" ".join(text) for text in np.split(words, np.cumsum(lengths)[:-1])], dtype=object)
+    return pool[rng.integers(0, distinct, count)]
+
+
+def write_dataset(directory, posts, comments, analysis, extension="parquet"):
+    """Write the synthetic data as files DataProcessor.load_data reads; returns their paths."""
+    paths = {}
+    for kind, name, df in [("posts", "posts", posts), ("comments", "comments", comments), ("analysis", "sentiment", analysis)]:
+        path = os.path.join(directory, f"{name}.{extension}")
+        if extension == "json":
+            df.to_json(path, orient="records", date_format="iso")
+        else:
+            write_table(df, path, kind)
+        paths[kind] = path
+    return paths
+
+
+def current_rss():
+    """Resident memory of this process in bytes, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def measure(function, repeats, reset=None):
+    """Run function repeats times; latency percentiles in ms and memory use in MB.
+
+    reset, if given, runs untimed before every call (to drop caches or earlier results).
+    peak_mb is the tracemalloc peak, which only sees Python allocations; Arrow buffers and
+    memory-mapped pages show up in arrow_mb (Arrow memory still allocated after the call) and
+    rss_delta_mb (change in resident memory over the call).
+    """
+    timings = []
+    for _ in range(repeats):
+        if reset:
+            reset()
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Tracing slows every allocation down, so memory is measured on one extra, untimed call
+    if reset:
+        reset()
+    rss_before, arrow_before = current_rss(), pa.total_allocated_bytes()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_after, arrow_after = current_rss(), pa.total_allocated_bytes()
+
+    timings.sort()
+    def percentile(q):
+        return round(float(np.percentile(timings, q)), 3)
+    return {
+        "repeats": repeats,
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(timings[-1], 3),
+        "peak_mb": round(peak / 2**20, 2),
+        "arrow_mb": round((arrow_after - arrow_before) / 2**20, 2),
+        "rss_delta_mb": None if rss_before is None else round((rss_after - rss_before) / 2**20, 2),
+    }
+
+
+def run_size(comment_count, repeats, load_repeats, extension, themed_fraction, client=None):
+    print(f"Benchmarking {comment_count} comments")
+    started = time.perf_counter()
+    posts, comments, analysis = generate_dataset(comment_count, themed_fraction=themed_fraction)
+    result = {"comments": comment_count, "posts": len(posts), "analysis": len(analysis),
+              "generate_seconds": round(time.perf_counter() - started, 2), "methods": {}, "endpoints": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, posts, comments, analysis, extension)
+        del posts, comments, analysis
+
+        loaded = []
+        def load():
+            processor = DataProcessor()
+            processor.load_data(paths["posts"], paths["comments"], paths["analysis"])
+            loaded.append(processor)
+        result["methods"]["load_data"] = measure(load, load_repeats, reset=loaded.clear)
+        processor = loaded.pop()
+
+        for name, method in METHODS.items():
+            # Rendering is what's measured, not the per-size image cache
+            result["methods"][name] = measure(lambda: method(processor), repeats,
+                                              reset=processor.wordcloud_cache.clear)
+            print(f"  {name}: p50 {result['methods'][name]['p50_ms']} ms")
+        del processor
+
+        if client is not None:
+            result["endpoints"] = run_endpoints(client, paths, repeats)
+    return result
+
+
+def run_endpoints(client, paths, repeats):
+    """Time every ENDPOINTS request through the API, once with empty caches and once answered from them."""
+    import main
+
+    response = client.post("/api/load-data", json={
+        "posts_file": paths["posts"], "comments_file": paths["comments"], "analysis_file": paths["analysis"]})
+    response.raise_for_status()
+
+    def clear_caches():
+        main.response_cache.entries.clear()
+        processor = main.snapshots.current
+        processor.wordcloud_cache.clear()
+        for partition in processor.partitions.values():
+            partition.wordcloud_cache.clear()
+
+    results = {}
+    for name, (url, headers) in ENDPOINTS.items():
+        def call():
+            client.get(url, headers=headers).raise_for_status()
+        results[name] = measure(call, repeats, reset=clear_caches)
+        results[f"{name}-cached"] = measure(call, repeats)
+        print(f"  {name}: p50 {results[name]['p50_ms']} ms, cached {results[f'{name}-cached']['p50_ms']} ms")
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """(size, name, baseline p50, p50) for every method or endpoint whose median got slower than threshold x baseline."""
+    previous = {run["comments"]: {**run["methods"], **run.get("endpoints", {})} for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        for name, stats in {**run["methods"], **run.get("endpoints", {})}.items():
+            before = previous.get(run["comments"], {}).get(name)
+            if before and stats["p50_ms"] > before["p50_ms"] * threshold:
+                regressions.append((run["comments"], name, before["p50_ms"], stats["p50_ms"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time DataProcessor and the API endpoints on synthetic data of several sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="comment counts to test")
+    parser.add_argument("--repeats", type=int, default=20, help="calls per method")
+    parser.add_argument("--load-repeats", type=int, default=3, help="calls to load_data")
+    parser.add_argument("--format", default="parquet", choices=["parquet", "arrow", "json"], help="file format loaded")
+    parser.add_argument("--themed-fraction", type=float, default=0.5, help="share of analysis rows with themes")
+    parser.add_argument("--skip-endpoints", action="store_true",
+                        help="only time DataProcessor; the endpoints need the environment main.py needs (Reddit credentials)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown factor counted as a regression")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        client = None
+        if not args.skip_endpoints:
+            from fastapi.testclient import TestClient
+            import main
+            client = stack.enter_context(TestClient(main.app))
+        runs = [run_size(size, args.repeats, args.load_repeats, args.format, args.themed_fraction, client)
+                for size in args.sizes]
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "format": args.format,
+        "runs": runs,
+        # ru_maxrss is in KB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        for size, name, before, after in regressions:
+            print(f"Regression: {name} at {size} comments, p50 {before} ms -> {after} ms")
+        if regressions:
+            raise SystemExit(1)
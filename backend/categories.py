@@ -0,0 +1,16 @@
+# Sentiment and theme categories shared by the LLM analyzer and the data processor.
+# Kept in a module of its own so the API can use them without importing torch.
+
+SENTIMENT_CATEGORIES = ["very negative", "negative", "neutral", "positive", "very positive"]
+
+THEME_CATEGORIES = [
+    "bugs/technical issues",
+    "game balance",
+    "gameplay mechanics",
+    "new features/content",
+    "monetization",
+    "community/social aspects",
+    "user interface",
+    "performance",
+    "praise/appreciation"
+]
@@ -0,0 +1,136 @@
+import ast
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from categories import SENTIMENT_CATEGORIES
+
+# Typed schemas for the three datasets the dashboard loads
+SCHEMAS = {
+    "posts": pa.schema([
+        ("id", pa.string()),
+        ("title", pa.string()),
+        ("score", pa.int64()),
+        ("num_comments", pa.int64()),
+        ("created_utc", pa.timestamp("ns")),
+        ("url", pa.string()),
+        ("selftext", pa.string()),
+        ("upvote_ratio", pa.float64()),
+    ]),
+    "comments": pa.schema([
+        ("id", pa.string()),
+        ("post_id", pa.string()),
+        ("parent_id", pa.string()),
+        ("body", pa.string()),
+        ("score", pa.int64()),
+        ("created_utc", pa.timestamp("ns")),
+        ("depth", pa.int32()),
+    ]),
+    "analysis": pa.schema([
+        ("comment_id", pa.string()),
+        ("sentiment_score", pa.float32()),
+        ("sentiment", pa.dictionary(pa.int8(), pa.string())),
+        ("themes", pa.list_(pa.string())),
+        ("summary", pa.string()),
+    ]),
+}
+
+# Arrow IPC files can be memory-mapped without decoding; Parquet is smaller on disk
+ARROW_EXTENSIONS = (".arrow", ".feather")
+COLUMNAR_EXTENSIONS = ARROW_EXTENSIONS + (".parquet",)
+
+
+def is_columnar(path):
+    return path.endswith(COLUMNAR_EXTENSIONS)
+
+
+def to_arrow(df, kind):
+    """Convert a DataFrame to an Arrow table with the schema for kind, filling in missing columns."""
+    schema = SCHEMAS[kind]
+    df = df.reindex(columns=schema.names)
+    if "created_utc" in df.columns:
+        df["created_utc"] = pd.to_datetime(df["created_utc"])
+    if kind == "analysis":
+        df["themes"] = _theme_lists(df["themes"])
+        # Every batch gets the same dictionary: Arrow IPC files can't replace it between batches
+        labels = pd.Categorical(df["sentiment"], categories=SENTIMENT_CATEGORIES)
+        unknown = labels.isna() & df["sentiment"].notna()
+        if unknown.any():
+            print(f"Dropping {unknown.sum()} unknown sentiment labels: {sorted(set(df['sentiment'][unknown]))}")
+        df["sentiment"] = labels
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _theme_lists(themes):
+    """Themes come as lists, as "['a', 'b']" strings (CSV/JSON files) or missing."""
+    parsed = {}
+    def parse(value):
+        if isinstance(value, str):
+            if value not in parsed:
+                try:
+                    parsed[value] = [str(theme) for theme in ast.literal_eval(value)]
+                except (ValueError, SyntaxError, TypeError):
+                    parsed[value] = []
+            return parsed[value]
+        if isinstance(value, (list, tuple)) or hasattr(value, "tolist"):
+            return [str(theme) for theme in list(value)]
+        return []
+    return [parse(value) for value in themes]
+
+
+def open_writer(path, kind):
+    """Open a writer for path (.parquet or .arrow/.feather) that accepts Arrow tables of the given kind."""
+    if path.endswith(ARROW_EXTENSIONS):
+        return ipc.new_file(path, SCHEMAS[kind])
+    return pq.ParquetWriter(path, SCHEMAS[kind])
+
+
+def write_table(df, path, kind):
+    """Write a DataFrame as a typed Parquet or Arrow IPC file, replacing the file atomically."""
+    root, extension = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{extension}"
+    with open_writer(tmp_path, kind) as writer:
+        writer.write_table(to_arrow(df, kind))
+    os.replace(tmp_path, path)
+
+
+def read_table(path, columns=None, arrow_strings=False):
+    """Load a Parquet or Arrow IPC file into a DataFrame, reading only the given columns.
+
+    Arrow IPC files are memory-mapped, so the column buffers are paged in straight from the file
+    instead of being parsed. Column buffers are released as soon as they are converted. With
+    arrow_strings, string columns become pandas "string[pyarrow]" columns that keep using the
+    Arrow buffers, so text read from a memory-mapped file is never copied.
+    """
+    arrow_file = path.endswith(ARROW_EXTENSIONS)
+    if columns is not None:
+        # Files written before a column was added simply don't have it
+        schema = ipc.open_file(pa.memory_map(path)).schema if arrow_file else pq.read_schema(path)
+        columns = [column for column in columns if column in schema.names]
+    if arrow_file:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    types_mapper = {pa.string(): pd.StringDtype("pyarrow")}.get if arrow_strings else None
+    return table.to_pandas(split_blocks=True, self_destruct=True, types_mapper=types_mapper)
+
+
+def convert_file(source, destination, kind):
+    """Convert a CSV, JSON, Parquet or Arrow IPC file of the given kind to the columnar format of destination."""
+    if is_columnar(source):
+        df = read_table(source)
+    else:
+        df = pd.read_json(source) if source.endswith(".json") else pd.read_csv(source)
+    write_table(df, destination, kind)
+    print(f"Converted {source} to {destination}")
+
+
+if __name__ == "__main__":
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(os.path.join(base_path, "data"), exist_ok=True)
+
+    for kind, source in [("posts", "posts.json"), ("comments", "comments.json"), ("analysis", "sentiment.json")]:
+        convert_file(os.path.join(base_path, "data", source),
+                     os.path.join(base_path, "data", f"{os.path.splitext(source)[0]}.parquet"), kind)
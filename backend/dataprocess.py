@@ -1,240 +1,406 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import pandas as pd
 import numpy as np
-from collections import Counter
+from collections import Counter, OrderedDict
 import datetime
+import bisect
+import heapq
+import ast
 import os
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+import re
+from wordcloud import WordCloud, STOPWORDS
 import io
 import base64
 from flask_cors import CORS
+from categories import THEME_CATEGORIES
+from columnar import ARROW_EXTENSIONS, is_columnar, read_table
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Words of the trending topics fallback: letters and digits, with apostrophes inside words ("don't")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+TREND_STOPWORDS = frozenset(STOPWORDS) | {'this', 'that', 'have', 'with', 'will', 'game', 'just', 'from', 'they', 'what', 'when'}
+
+# Word cloud words: WordCloud's own token pattern and stopwords, counted lowercased and without "'s"
+WORDCLOUD_PATTERN = r"\w[\w']*"
+WORDCLOUD_STOPWORDS = frozenset(word.lower() for word in STOPWORDS)
+
+def _as_float(value):
+    """Convert a stored float32 back to the decimal it was written as (0.4926, not 0.49259999)."""
+    return float(str(value))
+
+
+def _merge_plurals(frequencies):
+    """Count "cards" as "card" when both occur, like WordCloud's normalize_plurals."""
+    merged = dict(frequencies)
+    for word, count in frequencies.items():
+        if word.endswith('s') and not word.endswith('ss') and word[:-1] in merged:
+            merged[word[:-1]] += merged.pop(word)
+    return merged
+
+
+def render_wordcloud(frequencies, width, height, cache, as_png=False, max_entries=8):
+    """Render word frequencies as PNG bytes or a data URL, reusing the images in cache ((width, height) -> PNG).
+
+    Plurals are merged here rather than when counting, so counts of separate batches can simply be added.
+    """
+    png = cache.get((width, height))
+    if png is None:
+        try:
+            image = WordCloud(
+                width=width, 
+                height=height, 
+                background_color='white',
+                max_words=200,  # Limit words for performance
+                random_state=0
+            ).generate_from_frequencies(_merge_plurals(frequencies)).to_image()
+
+            buf = io.BytesIO()
+            image.save(buf, format='PNG')
+            png = buf.getvalue()
+        except Exception as e:
+            print(f"Error generating wordcloud: {e}")
+            return None
+        cache[(width, height)] = png
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end((width, height))
+
+    if as_png:
+        return png
+    # Convert to base64 string
+    img_str = base64.b64encode(png).decode('utf-8')
+    return f"data:image/png;base64,{img_str}"
+
+
 class DataProcessor:
+    # Categories of interest for developers
+    developer_categories = {
+        "bugs": ["bugs/technical issues"],
+        "balance": ["game balance"],
+        "features": ["new features/content", "gameplay mechanics"],
+        "ux": ["user interface", "performance"],
+        "monetization": ["monetization"]
+    }
+
+    # Steps reported to the load_data progress callback, in order
+    LOAD_STEPS = ["posts", "comments", "analysis", "indexes"]
+
+    # Periods get_sentiment_over_time can bucket by
+    SENTIMENT_PERIODS = ['hour', 'day', 'week']
+
+    # Also count adjacent word pairs ("mega knight") as trending topics when no themes are available
+    TREND_BIGRAMS = False
+
+    # Rendered word clouds kept per (width, height)
+    WORDCLOUD_CACHE_SIZE = 8
+
+    # The only comment columns the endpoints use; other columns aren't read from columnar files
+    comment_columns = ['id', 'post_id', 'body', 'score', 'created_utc']
+
     def __init__(self, posts_file=None, comments_file=None, analysis_file=None):
-        """Initialize with data files if provided (expects JSON files)."""
+        """Initialize with data files if provided (Parquet, Arrow IPC or JSON files)."""
         self.posts_df = None
         self.comments_df = None
         self.analysis_df = None
+        # Appended batches not yet merged into the frames above (see _append_frame and frame)
+        self.appended = {"posts": [], "comments": [], "analysis": []}
+
+        # Lookup structures rebuilt whenever the underlying frames change
+        self.comment_index = {}  # comment id -> row position in the comments (comments_df, then appended ones)
+        self.theme_index = {}    # theme -> [(-score, table row)] sorted ascending
+
+        # Themes parsed once at load time into (analysis row, theme code) pairs
+        self.theme_vocab = list(THEME_CATEGORIES)
+        self.theme_rows = np.empty(0, dtype=np.int32)
+        self.theme_codes = np.empty(0, dtype=np.int16)
+        self.theme_offsets = np.zeros(1, dtype=np.int64)  # analysis row i's themes are theme_codes[offsets[i]:offsets[i + 1]]
+        self.theme_counts = np.zeros(len(self.theme_vocab), dtype=np.int64)
+        self.theme_first_seen = np.zeros(len(self.theme_vocab), dtype=np.int64)
+
+        # Analysis rows joined with their comments, one row per analysis row (see _build_table)
+        self.table = None
+        self.pending_rows = {}  # comment id -> table rows still waiting for that comment
+
+        # Aggregates that append_data updates in place instead of recomputing
+        self.sentiment_rollup = None  # sentiment sum/count per hour; day and week views are derived from it
+        self.theme_rollup = None      # the same per (theme code, hour)
+        self.orderings = self._empty_orderings()  # column -> (sorted -value, table rows) for top comments
+        self.term_ids = {}  # trending fallback term -> id, ids given in order of first appearance
+        self.term_vocab = []
+        self.term_counts = np.zeros(0, dtype=np.int64)  # occurrences per term id over the joined comments
+        self.word_frequencies = Counter()  # word cloud terms over all comments
+        self.wordcloud_cache = OrderedDict()  # (width, height) -> PNG bytes for the current data
         
         # Load data if files are provided
         if any([posts_file, comments_file, analysis_file]):
             self.load_data(posts_file, comments_file, analysis_file)
     
-    def load_data(self, posts_file=None, comments_file=None, analysis_file=None):
-        """Load data from JSON files."""
+    def load_data(self, posts_file=None, comments_file=None, analysis_file=None, progress=None):
+        """Load data from Parquet / Arrow IPC files (see columnar.py) or legacy JSON files.
+
+        progress, if given, is called with the name of each step (see LOAD_STEPS) as it starts.
+        """
+        progress = progress or (lambda step: None)
+        comments_before = self.comments_df
+        analysis_before = self.analysis_df
         try:
+            progress("posts")
             if posts_file:
-                self.posts_df = pd.read_json(posts_file)
-                if 'created_utc' in self.posts_df.columns:
-                    # Handle created_utc which may be in string format
-                    if self.posts_df['created_utc'].dtype == 'object':
-                        self.posts_df['created_utc'] = pd.to_datetime(self.posts_df['created_utc'])
+                self.posts_df = self._read_frame(posts_file)
+                self.appended["posts"] = []
                 print(f"Posts DataFrame loaded: {self.posts_df.shape}")
         except Exception as e:
             print(f"Failed to load posts data: {e}")
             
         try:
+            progress("comments")
             if comments_file:
-                self.comments_df = pd.read_json(comments_file)
-                if 'created_utc' in self.comments_df.columns:
-                    # Handle created_utc which may be in string format
-                    if self.comments_df['created_utc'].dtype == 'object':
-                        self.comments_df['created_utc'] = pd.to_datetime(self.comments_df['created_utc'])
+                self.comments_df = self._read_frame(comments_file, columns=self.comment_columns)
+                self.appended["comments"] = []
                 print(f"Comments DataFrame loaded: {self.comments_df.shape}")
         except Exception as e:
             print(f"Failed to load comments data: {e}")
             
         try:
+            progress("analysis")
             if analysis_file:
-                self.analysis_df = pd.read_json(analysis_file)
-                if 'created_utc' in self.analysis_df.columns:
-                    # Handle created_utc which may be in string format
-                    if self.analysis_df['created_utc'].dtype == 'object':
-                        self.analysis_df['created_utc'] = pd.to_datetime(self.analysis_df['created_utc'])
+                self.analysis_df = self._read_frame(analysis_file)
+                self.appended["analysis"] = []
                 print(f"Analysis DataFrame loaded: {self.analysis_df.shape}")
         except Exception as e:
             print(f"Failed to load analysis data: {e}")
             
         # Load data from strings if provided (for testing and direct input)
-        self._update_data_structure()    
+        progress("indexes")
+        self._update_data_structure(
+            comments_changed=self.comments_df is not comments_before,
+            analysis_changed=self.analysis_df is not analysis_before)
+
+    def _read_frame(self, path, columns=None):
+        """Read one dataset; columnar files are memory-mapped and only the needed columns are read."""
+        if is_columnar(path):
+            # Text in Arrow IPC files stays in the memory-mapped buffers instead of becoming Python strings
+            return read_table(path, columns=columns, arrow_strings=path.endswith(ARROW_EXTENSIONS))
+
+        df = pd.read_json(path)
+        if 'created_utc' in df.columns:
+            # Handle created_utc which may be in string format
+            if df['created_utc'].dtype == 'object':
+                df['created_utc'] = pd.to_datetime(df['created_utc'])
+        return df
+
     def _parse_themes(self, themes_data):
         """Helper method to parse themes data which could be in different formats."""
-        if isinstance(themes_data, list):
-            return themes_data
-        elif isinstance(themes_data, str):
+        if isinstance(themes_data, str):
             try:
-                return eval(themes_data)  # Convert string representation to list
-            except:
+                themes_data = ast.literal_eval(themes_data)  # Convert string representation to list
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
                 return []
-        else:
-            return []
+        if isinstance(themes_data, (list, tuple, np.ndarray)):
+            return [theme for theme in themes_data if isinstance(theme, str)]
+        return []
+
+    def _themes_for_row(self, analysis_pos):
+        """Return the parsed themes of one analysis row from the exploded theme table."""
+        start, end = self.theme_offsets[analysis_pos], self.theme_offsets[analysis_pos + 1]
+        return [self.theme_vocab[code] for code in self.theme_codes[start:end]]
+
     def get_trending_topics(self, limit=30):
         """Extract trending topics from the analysis."""
         if self.analysis_df is None:
             return []
         
         # Check if we have themes data
-        if 'themes' not in self.analysis_df.columns or self.analysis_df['themes'].isnull().all() or (
-                self.analysis_df['themes'].astype(str).str.strip() == '[]').all():
-            # If no themes data, analyze comment text to create topics
-            if self.analysis_df is not None and self.comments_df is not None:
-                # Create a mapping of comment_id to comment text
-                comment_id_to_text = {}
-                for _, row in self.comments_df.iterrows():
-                    comment_id_to_text[row['id']] = row['body']
-                
-                # Extract words from comments referenced in analysis
-                comment_words = []
-                for _, row in self.analysis_df.iterrows():
-                    comment_id = row['comment_id']
-                    if comment_id in comment_id_to_text:
-                        # Simple word extraction (could be improved with NLP)
-                        words = comment_id_to_text[comment_id].lower().split()
-                        # Filter out common words and short words
-                        words = [w for w in words if len(w) > 3 and w not in 
-                                ['this', 'that', 'have', 'with', 'will', 'game', 'just', 'from', 'they', 'what', 'when']]
-                        comment_words.extend(words)
-                
-                # Count word occurrences
-                word_counts = Counter(comment_words)
-                
-                # Return top N words as topics
-                return [{"theme": word, "count": count} 
-                        for word, count in word_counts.most_common(limit)]
-            return []
-        
-        # If we have themes data, use it
-        all_themes = []
-        for themes_str in self.analysis_df['themes'].dropna():
-            try:
-                # Handle different formats of themes data
-                themes = self._parse_themes(themes_str)
-                if isinstance(themes, list):
-                    all_themes.extend(themes)
-            except Exception as e:
-                print(f"Error parsing themes: {e}")
-                continue
-        
-        # Count theme occurrences
-        theme_counts = Counter(all_themes)
+        if len(self.theme_codes) == 0:
+            # If no themes data, rank the words counted from the comment text at load time
+            if self.comments_df is None:
+                return []
+            rows = self._top_rows(self.term_counts, np.flatnonzero(self.term_counts), limit)
+            return [{"theme": self.term_vocab[term], "count": int(self.term_counts[term])} for term in rows]
         
-        # Return top N themes
-        return [{"theme": theme, "count": count} 
-                for theme, count in theme_counts.most_common(limit)]
+        # If we have themes data, rank the precomputed counts (ties keep first-appearance order)
+        present = np.flatnonzero(self.theme_counts)
+        order = present[np.lexsort((self.theme_first_seen[present], -self.theme_counts[present]))]
+        return [{"theme": self.theme_vocab[code], "count": int(self.theme_counts[code])}
+                for code in order[:limit]]
     
-    def get_sentiment_over_time(self, time_period='day'):
-        if self.analysis_df is None or self.comments_df is None:
-            return []
+    def get_sentiment_over_time(self, time_period='day', start=None, end=None, theme=None):
+        """Average sentiment per hour, day or week, read from the hourly rollup.
 
-        df = self.analysis_df.copy()
-        # Yhdistetään created_utc comments_df:stä oikealla sarakkeen nimellä
-        df = df.merge(self.comments_df[['id', 'created_utc']], left_on='comment_id', right_on='id', how='left')
+        start and end (anything pd.Timestamp accepts) keep only the hours in [start, end), and
+        theme restricts the graph to comments tagged with that theme.
+        """
+        return self.rollup_points(self.hourly_rollup(theme), time_period, start, end)
 
-        df['sentiment_score'] = pd.to_numeric(df['sentiment_score'], errors='coerce')
-        df['created_utc'] = pd.to_datetime(df['created_utc'])
+    def hourly_rollup(self, theme=None):
+        """Sentiment sum/count per hour, for all comments or the ones with a theme; None if there are none."""
+        if self.table is None or self.comments_df is None:
+            return None
+        if theme is None:
+            return self.sentiment_rollup
+        if theme not in self.theme_vocab or self.theme_rollup is None:
+            return None
+        try:
+            return self.theme_rollup.loc[self.theme_vocab.index(theme)]
+        except KeyError:
+            return None
 
-        if time_period == 'hour':
-            df['time_bucket'] = df['created_utc'].dt.floor('H')
-        elif time_period == 'day':
-            df['time_bucket'] = df['created_utc'].dt.floor('D')
-        elif time_period == 'week':
-            df['time_bucket'] = df['created_utc'].dt.floor('W')
-        else:
-            df['time_bucket'] = df['created_utc'].dt.floor('D')
+    def rollup_points(self, rollup, time_period='day', start=None, end=None):
+        """Turn an hourly rollup into the sentiment-over-time points for a period and date range."""
+        if rollup is None:
+            return []
 
-        sentiment_by_time = df.groupby('time_bucket')['sentiment_score'].agg(['mean', 'count']).reset_index()
+        period = time_period if time_period in self.SENTIMENT_PERIODS else 'day'
+        # Hours are sorted, so a date range is a slice of the rollup
+        hours = rollup.index
+        lower = 0 if start is None else hours.searchsorted(self._as_timestamp(start))
+        upper = len(hours) if end is None else hours.searchsorted(self._as_timestamp(end))
+        buckets = rollup.iloc[lower:upper]
+        if period != 'hour':
+            buckets = buckets.groupby(self._time_buckets(buckets.index.to_series(), period)).sum()
 
         result = []
-        for _, row in sentiment_by_time.iterrows():
-            mean_val = float(row['mean']) if not pd.isna(row['mean']) else 0.0
+        for bucket, total, count in zip(buckets.index, buckets['sum'], buckets['count']):
             result.append({
-                "timestamp": row['time_bucket'].isoformat(),
-                "sentiment": mean_val,
-                "count": int(row['count'])
+                "timestamp": bucket.isoformat(),
+                "sentiment": float(total / count) if count else 0.0,
+                "count": int(count)
             })
 
-        return sorted(result, key=lambda x: x['timestamp'])
-
+        return result
 
+    def _as_timestamp(self, value):
+        """Parse a date filter; timestamps are stored as naive UTC."""
+        timestamp = pd.Timestamp(value)
+        return timestamp.tz_convert(None) if timestamp.tzinfo is not None else timestamp
 
+    def _top_rows(self, values, candidates, limit):
+        """Return the candidate rows with the largest values, ties broken by row order."""
+        candidate_values = values[candidates]
+        if len(candidates) > limit:
+            # Partition first so only the rows that can make the cut get sorted
+            kth = np.partition(candidate_values, len(candidates) - limit)[len(candidates) - limit]
+            keep = candidate_values >= kth
+            candidates, candidate_values = candidates[keep], candidate_values[keep]
+        order = np.lexsort((candidates, -candidate_values))[:limit]
+        return candidates[order]
     
-    def get_top_comments(self, limit=50, sort_by='score'):
-        """Get top comments based on score or other metrics."""
-        if self.analysis_df is None or self.comments_df is None:
+    def get_top_comments(self, limit=50, sort_by='score', after=None, theme=None, sentiment=None):
+        """Get top comments based on score or other metrics.
+
+        Pages are read from the pre-sorted orderings: pass after="<score>,<id>" of the last comment
+        of a page (its sentiment instead of its score when sorting by sentiment) to get the next
+        one. theme and sentiment keep only comments with that theme or sentiment label.
+        """
+        if self.table is None or self.comments_df is None:
             return []
 
-        # Create a copy to avoid modifying original dataframes
-        analysis_df = self.analysis_df.copy()
-        comments_df = self.comments_df.copy()
-
-        # Merge dataframes
-        merged_df = pd.merge(
-            analysis_df, 
-            comments_df[['id', 'body', 'score', 'created_utc']],
-            left_on='comment_id', 
-            right_on='id',
-            how='inner'
-        )
-
-        # Remove infinite values and NaNs that aren't JSON-compatible
-        merged_df = merged_df.replace([float('inf'), float('-inf')], np.nan)
-        merged_df = merged_df.dropna(subset=['sentiment_score', 'body', 'score'])
-        
-        # Sort based on requested criterion
-        if sort_by == 'sentiment':
-            merged_df = merged_df.sort_values('sentiment_score', ascending=False)
-        else:  # default to score
-            merged_df = merged_df.sort_values('score', ascending=False)
+        start = 0
+        if after is not None:
+            lower, upper, past = self.cursor_bounds(sort_by, after)
+            start = upper if past is None else past
+        return self.comment_records(self.page_rows(limit, sort_by, start, theme, sentiment))
 
-        # Extract top comments
+    def ordering(self, sort_by):
+        """(sorted -value, table rows) ordering for a sort_by of 'score' or 'sentiment'."""
+        return self.orderings['sentiment_score' if sort_by == 'sentiment' else 'score']
+
+    def page_rows(self, limit, sort_by, start=0, theme=None, sentiment=None):
+        """Table rows of one page, starting at position start of the ordering."""
+        ordered = self.ordering(sort_by)[1]
+        matches = self._row_filter(theme, sentiment)
+        if matches is None:
+            return ordered[start:start + limit]
+
+        # Scan the ordering in growing chunks until enough rows pass the filter
+        found, chunk = [], max(limit * 4, 256)
+        while start < len(ordered) and sum(len(part) for part in found) < limit:
+            candidates = ordered[start:start + chunk]
+            found.append(candidates[matches(candidates)])
+            start, chunk = start + chunk, chunk * 2
+        return np.concatenate(found)[:limit] if found else ordered[:0]
+
+    def comment_records(self, rows):
+        """The top-comments dicts for table rows."""
         top_comments = []
-        for _, row in merged_df.head(limit).iterrows():
+        part = self.table.iloc[rows]
+        for row, comment_id, body, score, sentiment_score, category, summary, created in zip(
+                rows, part['comment_id'], self._table_bodies(rows), part['score'], part['sentiment_score'].to_numpy(),
+                part['sentiment'], part['summary'], part['created_utc']):
             try:
-                created_str = row['created_utc'].isoformat() if hasattr(row['created_utc'], 'isoformat') else str(row['created_utc'])
-                themes_val = self._parse_themes(row['themes'])
-                
                 top_comments.append({
-                    "id": row['comment_id'],
-                    "body": row['body'],
-                    "score": int(row['score']),
-                    "sentiment": float(row['sentiment_score']),
-                    "sentiment_category": row['sentiment'],
-                    "themes": themes_val,
-                    "summary": row.get('summary', ''),
-                    "created_utc": created_str,
+                    "id": comment_id,
+                    "body": body,
+                    "score": int(score),
+                    "sentiment": _as_float(sentiment_score),
+                    "sentiment_category": category,
+                    "themes": self._themes_for_row(row),
+                    "summary": summary,
+                    "created_utc": created.isoformat(),
                 })
             except Exception as e:
-                print(f"Error processing row id {row.get('comment_id', 'unknown')}: {e}")
+                print(f"Error processing row id {comment_id}: {e}")
 
         return top_comments
+
+    def cursor_bounds(self, sort_by, after):
+        """For an "<value>,<id>" cursor: where the rows tied on its value start and end in the
+        ordering, and the position just past its comment (None if it isn't among them)."""
+        keys, ordered = self.ordering(sort_by)
+        value, _, comment_id = str(after).partition(',')
+        # Values are stored as float32, so the cursor is rounded the same way
+        key = -float(np.float32(value))
+        lower, upper = int(np.searchsorted(keys, key, 'left')), int(np.searchsorted(keys, key, 'right'))
+        same = np.flatnonzero(self.table['comment_id'].iloc[ordered[lower:upper]].to_numpy() == comment_id)
+        return lower, upper, lower + int(same[-1]) + 1 if len(same) else None
+
+    def _row_filter(self, theme=None, sentiment=None):
+        """A function telling which of the given table rows match the filters, or None without filters."""
+        checks = []
+        if theme is not None:
+            code = self.theme_vocab.index(theme) if theme in self.theme_vocab else None
+            if code is None:
+                checks.append(lambda rows: np.zeros(len(rows), dtype=bool))
+            elif code < len(THEME_CATEGORIES):
+                theme_mask = self.table['theme_mask'].to_numpy()
+                checks.append(lambda rows: (theme_mask[rows] >> code) & 1 == 1)
+            else:
+                # Themes outside THEME_CATEGORIES have no bit in theme_mask
+                theme_rows = np.unique(self.theme_rows[self.theme_codes == code])
+                checks.append(lambda rows: np.isin(rows, theme_rows))
+        if sentiment is not None:
+            labels = self.table['sentiment'].cat
+            if sentiment in labels.categories:
+                label_codes, label = labels.codes.to_numpy(), labels.categories.get_loc(sentiment)
+                checks.append(lambda rows: label_codes[rows] == label)
+            else:
+                checks.append(lambda rows: np.zeros(len(rows), dtype=bool))
+        if not checks:
+            return None
+        return lambda rows: np.logical_and.reduce([check(rows) for check in checks])
     
     def get_theme_distribution(self):
-        print(self.analysis_df['themes'].head(10))
         """Get the distribution of themes."""
         if self.analysis_df is None:
             return {}
-        # Extract all themes
-        all_themes = []
-        for themes_str in self.analysis_df['themes'].dropna():
-            try:
-                themes = self._parse_themes(themes_str)
-                if isinstance(themes, list):
-                    all_themes.extend(themes)
-            except Exception as e:
-                print(f"Error parsing themes: {e}")
-                continue
-        
-        # Count theme occurrences
-        theme_counts = Counter(all_themes)
-        total = sum(theme_counts.values())
-        
-        # Calculate percentages
+        return self.theme_percentages(self.theme_totals())
+
+    def theme_totals(self):
+        """{theme: count} for every theme that occurs, in order of first appearance."""
+        present = np.flatnonzero(self.theme_counts)
+        return {self.theme_vocab[code]: int(self.theme_counts[code])
+                for code in present[np.argsort(self.theme_first_seen[present], kind='stable')]}
+
+    @staticmethod
+    def theme_percentages(totals):
+        total = sum(totals.values())
+
+        # Calculate percentages, keeping the themes in order of first appearance
         result = {}
-        for theme, count in theme_counts.items():
+        for theme, count in totals.items():
             result[theme] = {
                 "count": count,
                 "percentage": round(count / total * 100, 2) if total > 0 else 0
@@ -242,103 +408,526 @@ class DataProcessor:
         
         return result
     
-    def generate_wordcloud(self, width=800, height=400):
-        """Generate a word cloud image from comment text."""
+    def generate_wordcloud(self, width=800, height=400, as_png=False):
+        """Render a word cloud of all comment text as a base64 data URL, or as raw PNG bytes.
+
+        The word frequencies are counted at load time and the layout is seeded, so the same data
+        always gives the same image. Rendered images are kept per size until the data changes.
+        """
         if self.comments_df is None:
             return None
-        
-        try:
-            # Combine all comment text, limit to reduce memory usage
-            sample_size = min(1000, len(self.comments_df))
-            sampled_comments = self.comments_df.sample(sample_size) if len(self.comments_df) > sample_size else self.comments_df
-            text = " ".join(sampled_comments['body'].dropna().astype(str))
-            
-            # Create word cloud
-            wordcloud = WordCloud(
-                width=width, 
-                height=height, 
-                background_color='white',
-                max_words=200  # Limit words for performance
-            ).generate(text)
-            
-            # Convert to image
-            plt.figure(figsize=(width/100, height/100), dpi=100)
-            plt.imshow(wordcloud, interpolation='bilinear')
-            plt.axis('off')
-            
-            # Save to a bytes buffer
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png')
-            plt.close()
-            buf.seek(0)
-            
-            # Convert to base64 string
-            img_str = base64.b64encode(buf.read()).decode('utf-8')
-            return f"data:image/png;base64,{img_str}"
-        except Exception as e:
-            print(f"Error generating wordcloud: {e}")
-            return None
+        return render_wordcloud(self.word_frequencies, width, height, self.wordcloud_cache, as_png,
+                                self.WORDCLOUD_CACHE_SIZE)
+
+    def _count_words(self, bodies):
+        """Word counts for the word cloud; counts of separate batches add up to the count of all of them."""
+        # Identical bodies are tokenized once and counted once per copy
+        body_codes, unique_bodies = pd.factorize(bodies.dropna().astype(str))
+        if len(unique_bodies) == 0:
+            return Counter()
+        words = pd.Series(unique_bodies, dtype=object).str.lower().str.findall(WORDCLOUD_PATTERN).explode().dropna()
+        words = words.str.removesuffix("'s")
+        keep = ~words.isin(WORDCLOUD_STOPWORDS) & ~words.str.isdigit() & (words != "")
+        copies = np.bincount(body_codes, minlength=len(unique_bodies))
+        counts = pd.Series(copies[words.index[keep]], index=words[keep].to_numpy()).groupby(level=0, sort=False).sum()
+        return Counter(dict(zip(counts.index, counts.tolist())))
     
-    def get_developer_insights(self):
+    def get_developer_insights(self, limit=5):
         """Generate insights specifically for developers."""
-        if self.analysis_df is None or self.comments_df is None:
+        if self.table is None or self.comments_df is None:
             return {}
-        
-        # Categories of interest for developers
-        categories = {
-            "bugs": ["bugs/technical issues"],
-            "balance": ["game balance"],
-            "features": ["new features/content", "gameplay mechanics"],
-            "ux": ["user interface", "performance"],
-            "monetization": ["monetization"]
-        }
-        
+
+        table = self.table
         insights = {}
-        
-        # For each category, find relevant comments
-        for category_name, themes in categories.items():
+
+        # For each category, merge the pre-sorted per-theme lists and take the top entries
+        for category_name, themes in self.developer_categories.items():
+            chosen = []
+            seen_rows = set()
+            ranked = heapq.merge(*(self.theme_index.get(theme, []) for theme in themes))
+
+            for neg_score, row in ranked:
+                if len(chosen) >= limit:
+                    break
+                # A row tagged with several themes of the same category is listed once
+                if row in seen_rows:
+                    continue
+                seen_rows.add(row)
+                chosen.append((neg_score, row))
+
             category_comments = []
-            
-            for _, row in self.analysis_df.iterrows():
+            bodies = self._table_bodies(np.array([row for _, row in chosen], dtype=np.int64))
+            for (neg_score, row), body in zip(chosen, bodies):
                 try:
-                    row_themes = self._parse_themes(row['themes'])
-                    
-                    if any(theme in row_themes for theme in themes):
-                        # Find the corresponding comment text
-                        comment_row = self.comments_df[self.comments_df['id'] == row['comment_id']]
-                        if not comment_row.empty:
-                            comment_text = comment_row.iloc[0]['body']
-                            score = comment_row.iloc[0]['score']
-                            
-                            category_comments.append({
-                                "id": row['comment_id'],
-                                "text": comment_text,
-                                "score": int(score),
-                                "sentiment": float(row['sentiment_score']),
-                                "summary": row.get('summary', '')
-                            })
+                    category_comments.append({
+                        "id": table['comment_id'].iat[row],
+                        "text": body,
+                        "score": int(-neg_score),
+                        "sentiment": _as_float(table['sentiment_score'].iat[row]),
+                        "summary": table['summary'].iat[row]
+                    })
                 except Exception as e:
                     print(f"Error processing developer insights for row: {e}")
                     continue
-            
-            # Sort by score and get top 5
-            category_comments = sorted(category_comments, key=lambda x: x['score'], reverse=True)[:5]
+
             insights[category_name] = category_comments
-        
+
         return insights
-    
-    def _update_data_structure(self):
+
+    def _update_data_structure(self, comments_changed=True, analysis_changed=True):
         """Update data structure to ensure compatibility with API methods."""
+        # Rebuilds read the frames whole
+        for name in self.appended:
+            self.frame(name)
+        if self.analysis_df is not None:
+            self.analysis_df = self._clean_analysis(self.analysis_df)
+
+        # Only rebuild the indexes that depend on frames that actually changed
+        if analysis_changed:
+            self._normalize_themes()
+        if comments_changed:
+            self._build_comment_index()
+            self.word_frequencies = self._count_words(self.comments_df['body']) if self._has_bodies() else Counter()
+            self.wordcloud_cache.clear()
+        if comments_changed or analysis_changed:
+            self._build_table()
+            self._build_theme_index()
+            self._build_aggregates()
+
+    def _has_bodies(self):
+        return self.comments_df is not None and any(
+            'body' in df.columns for df in [self.comments_df, *self.appended["comments"]])
+
+    def _clean_analysis(self, analysis_df):
         # Check and handle themes field in analysis data
-        if self.analysis_df is not None and 'themes' in self.analysis_df.columns:
-            # Ensure themes is properly formatted
-            self.analysis_df['themes'] = self.analysis_df['themes'].apply(
-                lambda x: '[]' if pd.isna(x) or x == '' else x)
+        if 'themes' in analysis_df.columns:
+            # Ensure themes is properly formatted (lists from JSON arrays and Arrow files are kept as-is)
+            analysis_df['themes'] = analysis_df['themes'].apply(
+                lambda x: '[]' if not isinstance(x, (list, np.ndarray)) and (pd.isna(x) or x == '') else x)
             
         # Add any missing columns with default values
-        if self.analysis_df is not None:
-            if 'summary' not in self.analysis_df.columns:
-                self.analysis_df['summary'] = None
+        if 'summary' not in analysis_df.columns:
+            analysis_df['summary'] = None
+        return analysis_df
+
+    def _build_comment_index(self):
+        """Map each comment id to its row position in comments_df (first occurrence wins)."""
+        self.comment_index = {}
+        if self.comments_df is None or 'id' not in self.comments_df.columns:
+            return
+
+        ids = self.comments_df['id']
+        first = ~ids.duplicated()
+        self.comment_index = dict(zip(ids[first], np.flatnonzero(first.to_numpy())))
+
+    def _normalize_themes(self):
+        """Parse the themes column once into (analysis row, theme code) pairs and count them."""
+        self.theme_vocab = list(THEME_CATEGORIES)
+        self.theme_rows = np.empty(0, dtype=np.int32)
+        self.theme_codes = np.empty(0, dtype=np.int16)
+
+        if self.analysis_df is not None and 'themes' in self.analysis_df.columns:
+            self.theme_rows, self.theme_codes = self._encode_themes(self.analysis_df['themes'])
+        self.theme_offsets = self._theme_offsets(self.theme_rows, 0 if self.analysis_df is None else len(self.analysis_df))
+
+        self.theme_counts = np.bincount(self.theme_codes, minlength=len(self.theme_vocab))
+        self.theme_first_seen = np.full(len(self.theme_vocab), len(self.theme_codes), dtype=np.int64)
+        codes, first_seen = np.unique(self.theme_codes, return_index=True)
+        self.theme_first_seen[codes] = first_seen
+
+    def _theme_offsets(self, rows, row_count, start=0):
+        """Offsets into the theme arrays where each of row_count rows' themes begin, plus the end offset."""
+        ends = start + np.cumsum(np.bincount(rows, minlength=row_count), dtype=np.int64)
+        return np.r_[np.int64(start), ends]
+
+    def _encode_themes(self, themes):
+        """Turn a column of theme lists into (row position, theme code) arrays, growing theme_vocab as needed."""
+        # The same theme strings repeat across many rows, so each distinct one is parsed once
+        parsed = {}
+        def parse(value):
+            if not isinstance(value, str):
+                return self._parse_themes(value)
+            if value not in parsed:
+                parsed[value] = self._parse_themes(value)
+            return parsed[value]
+
+        exploded = pd.Series([parse(value) for value in themes], dtype=object).explode().dropna()
+        if exploded.empty:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int16)
+
+        # Known categories keep fixed codes, anything else the model produced is appended
+        extra = pd.unique(exploded[~exploded.isin(self.theme_vocab)])
+        self.theme_vocab.extend(extra)
+        rows = exploded.index.to_numpy(dtype=np.int32)
+        codes = pd.Categorical(exploded, categories=self.theme_vocab).codes.astype(np.int16)
+        return rows, codes
+
+    def _build_table(self):
+        """Join analysis rows with their comments once into a compact, typed table.
+
+        Row i of the table is row i of analysis_df, so the exploded theme arrays index it directly.
+        """
+        self.table = None
+        self.pending_rows = {}
+        if self.analysis_df is None or 'comment_id' not in self.analysis_df.columns:
+            return
+
+        self.table = self._table_part(self.analysis_df, self.theme_rows, self.theme_codes)
+
+    def _table_part(self, analysis_df, theme_rows, theme_codes, offset=0):
+        """Build table rows for analysis_df, which becomes table rows offset, offset + 1, ...
+
+        Rows whose comment isn't loaded yet are remembered in pending_rows so appending the
+        comment later can fill them in.
+        """
+        table = analysis_df.reindex(columns=['comment_id', 'sentiment', 'sentiment_score', 'summary'])
+        table = table.reset_index(drop=True)
+
+        # Duplicate comment ids resolve to their first row, matching comment_index
+        # (looked up row by row: Series.map would turn the whole comment_index into a Series first)
+        positions = pd.Series([self.comment_index.get(comment_id) for comment_id in table['comment_id']],
+                              dtype=np.float64)
+        matched = positions.notna()
+        # Bodies aren't copied in; they are read from the comments through comment_row (see _table_bodies)
+        table['comment_row'] = positions.fillna(-1).to_numpy(dtype=np.int64)
+        if self.comments_df is not None and matched.any():
+            comments = self._frame_rows("comments", ['score', 'created_utc'], positions.fillna(0).to_numpy(dtype=np.int64))
+            table = pd.concat([table, comments.where(matched, np.nan)], axis=1)
+        else:
+            table = table.assign(score=np.nan, created_utc=pd.NaT)
+
+        for comment_id, row in zip(table['comment_id'][~matched], np.flatnonzero(~matched.to_numpy())):
+            if isinstance(comment_id, str):
+                self.pending_rows.setdefault(comment_id, []).append(offset + row)
+
+        table['sentiment'] = table['sentiment'].astype('category')
+        # Missing summaries are served as null, never NaN
+        table['summary'] = table['summary'].astype(object).where(table['summary'].notna(), None)
+        for column in ['sentiment_score', 'score']:
+            table[column] = self._clean_numbers(table[column])
+        table['created_utc'] = pd.to_datetime(table['created_utc'], errors='coerce')
+
+        # Bitmask over the fixed THEME_CATEGORIES codes
+        theme_mask = np.zeros(len(table), dtype=np.uint16)
+        known = theme_codes < len(THEME_CATEGORIES)
+        np.bitwise_or.at(theme_mask, theme_rows[known], (1 << theme_codes[known]).astype(np.uint16))
+        table['theme_mask'] = theme_mask
+        return table
+
+    def _table_bodies(self, rows):
+        """Comment bodies of table rows, taken from the comments; missing where a row has no comment yet."""
+        positions = self.table['comment_row'].to_numpy()[rows]
+        matched = positions >= 0
+        if not self._has_bodies() or not matched.any():
+            return pd.Series([None] * len(positions), dtype=object)
+        bodies = self._frame_rows("comments", ['body'], np.where(matched, positions, 0))['body']
+        return bodies.where(matched)
+
+    def _frame_rows(self, name, columns, positions):
+        """The given columns of posts, comments or analysis rows at positions, counted across the frame
+        and its appended batches."""
+        chunks = [getattr(self, f"{name}_df"), *self.appended[name]]
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(chunks) == 1:
+            return chunks[0].iloc[positions].reindex(columns=columns).reset_index(drop=True)
+
+        # Take each chunk's rows, then put them back in the order asked for
+        starts = np.cumsum([0] + [len(chunk) for chunk in chunks])
+        owner = np.searchsorted(starts, positions, 'right') - 1
+        order = np.argsort(owner, kind='stable')
+        parts = [chunks[i].iloc[positions[order][owner[order] == i] - starts[i]] for i in np.unique(owner)]
+        parts = [part.reindex(columns=columns) for part in parts]
+        taken = pd.concat(parts, ignore_index=True) if parts else chunks[0].iloc[:0].reindex(columns=columns)
+        return taken.iloc[np.argsort(order)].reset_index(drop=True)
+
+    def _exact_scores(self, rows):
+        """sentiment_score of table rows as float64, read from the analysis rows instead of the float32 table."""
+        values = self._frame_rows("analysis", ['sentiment_score'], rows)['sentiment_score']
+        if values.dtype == np.float32:
+            # Columnar files store float32; recover the decimals that were written, as _as_float does
+            values = pd.Series(values.to_numpy().astype(str))
+        values = pd.to_numeric(values, errors='coerce').astype(np.float64)
+        return values.replace([np.inf, -np.inf], np.nan).to_numpy()
+
+    def _clean_numbers(self, values):
+        # Infinite values aren't JSON-compatible, so they are treated as missing
+        return pd.to_numeric(values, errors='coerce').replace([np.inf, -np.inf], np.nan).astype(np.float32)
+
+    def _time_buckets(self, created, period):
+        """Floor timestamps to the start of their hour, day or calendar week (starting Monday)."""
+        if period == 'hour':
+            return created.dt.floor('h')
+        if period == 'week':
+            # Weeks are not a fixed frequency, so bucket by calendar week
+            return created.dt.to_period('W').dt.start_time
+        return created.dt.floor('D')
+
+    def _build_aggregates(self):
+        """Recompute the sentiment rollups, top comment orderings and term counts over the whole table."""
+        self.sentiment_rollup = None
+        self.theme_rollup = None
+        self.orderings = self._empty_orderings()
+        self.term_ids = {}
+        self.term_vocab = []
+        self.term_counts = np.zeros(0, dtype=np.int64)
+        if self.table is not None:
+            self._add_to_aggregates(np.arange(len(self.table)))
+
+    def _add_to_aggregates(self, rows):
+        """Fold table rows that just became complete into the sentiment rollups, top comment orderings and term counts."""
+        part = self.table.iloc[rows]
+        bodies = self._table_bodies(rows)
+        self._add_terms(bodies)
+        # Summed from the float64 analysis scores, so averages carry no float32 rounding noise
+        scores = self._exact_scores(rows)
+        hours = part['created_utc'].dt.floor('h').to_numpy()
+        self.sentiment_rollup = self._merge_rollup(
+            self.sentiment_rollup, pd.Series(scores).groupby(hours).agg(['sum', 'count']))
+
+        # A row listing the same theme twice counts once for that theme
+        positions, codes = self._theme_pairs(rows)
+        pairs = np.unique(np.stack([positions, codes.astype(np.int64)]), axis=1)
+        by_theme = pd.Series(scores[pairs[0]]).groupby([pairs[1], hours[pairs[0]]]).agg(['sum', 'count'])
+        by_theme.index.names = ['theme', 'hour']
+        self.theme_rollup = self._merge_rollup(self.theme_rollup, by_theme)
+
+        # Rows that aren't JSON-compatible (no matching comment, NaN or infinite scores) are never listed
+        valid = bodies.notna().to_numpy() & (part['score'].notna() & part['sentiment_score'].notna()).to_numpy()
+        for column, ordering in self.orderings.items():
+            self.orderings[column] = self._merge_ordering(ordering, column, rows[valid])
+
+    def _empty_orderings(self):
+        return {column: (np.empty(0), np.empty(0, dtype=np.int64)) for column in ['score', 'sentiment_score']}
+
+    def _merge_ordering(self, ordering, column, rows):
+        """Insert table rows into an ordering sorted by value descending, ties broken by row order."""
+        keys, ordered = ordering
+        rows = np.asarray(rows, dtype=np.int64)
+        new_keys = -self.table[column].to_numpy(dtype=np.float64)[rows]
+        order = np.lexsort((rows, new_keys))
+        new_keys, rows = new_keys[order], rows[order]
+        if len(ordered) == 0:
+            return new_keys, rows
+
+        positions = np.searchsorted(keys, new_keys, 'left')
+        tie_ends = np.searchsorted(keys, new_keys, 'right')
+        for i in np.flatnonzero(tie_ends > positions):
+            positions[i] += np.searchsorted(ordered[positions[i]:tie_ends[i]], rows[i])
+        return np.insert(keys, positions, new_keys), np.insert(ordered, positions, rows)
+
+    def _tokenize(self, text):
+        """Lowercased words longer than three characters that aren't stopwords, plus bigrams if enabled."""
+        words = [word for word in TOKEN_PATTERN.findall(text.lower())
+                 if len(word) > 3 and word not in TREND_STOPWORDS]
+        if self.TREND_BIGRAMS:
+            words += [f"{first} {second}" for first, second in zip(words, words[1:])]
+        return words
+
+    def _add_terms(self, bodies):
+        """Count the words of comment bodies into term_counts, adding unseen words to the vocabulary."""
+        # Identical bodies are tokenized once and counted once per copy
+        body_codes, unique_bodies = pd.factorize(bodies.dropna().astype(str))
+        copies = np.bincount(body_codes)
+        tokens, weights = [], []
+        for body, count in zip(unique_bodies, copies):
+            words = self._tokenize(body)
+            tokens.extend(words)
+            weights.extend([count] * len(words))
+        if not tokens:
+            return
+
+        codes, terms = pd.factorize(pd.Series(tokens, dtype=object))
+        counts = np.bincount(codes, weights=weights).astype(np.int64)
+        known = len(self.term_vocab)
+        ids = np.array([self.term_ids.setdefault(term, len(self.term_ids)) for term in terms], dtype=np.int64)
+        self.term_vocab.extend(term for term, term_id in zip(terms, ids) if term_id >= known)
+        self.term_counts = np.r_[self.term_counts, np.zeros(len(self.term_ids) - len(self.term_counts), dtype=np.int64)]
+        self.term_counts[ids] += counts
+
+    def _merge_rollup(self, current, update):
+        # Rows without a timestamp have no hour and were left out by groupby
+        return update if current is None else current.add(update, fill_value=0)
+
+    def _theme_pairs(self, rows):
+        """(position in rows, theme code) for every theme of the given table rows."""
+        # Each row's themes are one contiguous slice of the theme arrays
+        starts = self.theme_offsets[rows]
+        lengths = self.theme_offsets[rows + 1] - starts
+        positions = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return positions, self.theme_codes[np.repeat(starts, lengths) + offsets]
+
+    def _build_theme_index(self):
+        """Build the theme -> table rows inverted index, each list pre-sorted by comment score."""
+        self.theme_index = {}
+        if self.table is None or len(self.theme_codes) == 0:
+            return
+
+        self.theme_index = dict(self._theme_runs(self.theme_codes, self.theme_rows))
+
+    def _theme_runs(self, codes, rows):
+        """(theme, [(-score, row)] sorted ascending) for every theme among the (theme code, table row) pairs."""
+        # A row listing the same theme twice is indexed once
+        pairs = np.unique(np.stack([codes.astype(np.int64), np.asarray(rows, dtype=np.int64)]), axis=1)
+        codes, rows = pairs[0], pairs[1]
+
+        # Rows without a matching comment or a usable score can never be listed
+        pair_score = self.table['score'].to_numpy(dtype=np.float64)[rows]
+        valid = ~np.isnan(pair_score) & self._table_bodies(rows).notna().to_numpy()
+        codes, rows, pair_score = codes[valid], rows[valid], pair_score[valid]
+
+        order = np.lexsort((rows, -pair_score, codes))
+        codes, rows, pair_score = codes[order], rows[order], pair_score[order]
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(codes)]):
+            if end > start:
+                yield self.theme_vocab[codes[start]], list(zip((-pair_score[start:end]).tolist(), rows[start:end].tolist()))
+
+    def _insert_into_theme_index(self, rows):
+        """Add table rows that just became complete to the per-theme lists, keeping them sorted."""
+        positions, codes = self._theme_pairs(rows)
+        for theme, entries in self._theme_runs(codes, rows[positions]):
+            existing = self.theme_index.setdefault(theme, [])
+            if len(entries) < 32:
+                for entry in entries:
+                    bisect.insort(existing, entry)
+            else:
+                # Both lists are sorted, so timsort merges them in one linear pass
+                existing.extend(entries)
+                existing.sort()
+
+    def append_data(self, posts=None, comments=None, analysis=None):
+        """Append batches of new posts, comments and analysis rows (DataFrames or lists of dicts).
+
+        Only the new rows are parsed and joined, and they are folded into the existing theme
+        counts, sentiment rollups, top comment orderings and theme index; nothing is rebuilt. Analysis rows
+        whose comment hasn't arrived yet are completed when it does. Returns the number of rows
+        added per dataset.
+        """
+        posts, comments, analysis = (self._as_frame(batch) for batch in (posts, comments, analysis))
+        # Checked up front so a bad batch leaves nothing half-applied
+        self.validate_batch(comments, analysis)
+        if posts is not None:
+            self._append_frame("posts", posts)
+        # Comments first, so analysis rows in the same batch find them
+        if comments is not None:
+            self._append_comments(comments)
+        if analysis is not None:
+            self._append_analysis(analysis)
+        return {name: 0 if batch is None else len(batch)
+                for name, batch in [("posts", posts), ("comments", comments), ("analysis", analysis)]}
+
+    @staticmethod
+    def validate_batch(comments=None, analysis=None):
+        """Raise ValueError if a batch of comments or analysis rows can't be appended."""
+        if comments is not None and len(comments) and 'id' not in pd.DataFrame(comments).columns:
+            raise ValueError("Comments need an id")
+        if analysis is not None and len(analysis) and 'comment_id' not in pd.DataFrame(analysis).columns:
+            raise ValueError("Analysis rows need a comment_id")
+
+    def _append_frame(self, name, batch):
+        """Append a batch to posts, comments or analysis without copying the whole frame every time.
+
+        Batches wait in appended[name] and are merged into the frame once they add up to a
+        quarter of it, so each row is copied a bounded number of times however small the batches.
+        Arrow-backed text columns stay Arrow-backed: object strings in a batch would turn a whole
+        memory-mapped string[pyarrow] column into a private copy of Python objects.
+        """
+        current = getattr(self, f"{name}_df")
+        if current is None:
+            setattr(self, f"{name}_df", batch)
+            return
+        arrow_strings = {column: dtype for column, dtype in current.dtypes.items()
+                         if column in batch.columns and isinstance(dtype, pd.StringDtype)}
+        pending = self.appended[name]
+        pending.append(batch.astype(arrow_strings))
+        if len(pending) > 32:
+            pending[:] = [pd.concat(pending, ignore_index=True)]
+        if sum(len(df) for df in pending) * 4 >= len(current):
+            self.frame(name)
+
+    def frame(self, name):
+        """The whole posts, comments or analysis frame, merging in any batches appended since."""
+        pending = self.appended[name]
+        if pending:
+            setattr(self, f"{name}_df", pd.concat([getattr(self, f"{name}_df"), *pending], ignore_index=True))
+            self.appended[name] = []
+        return getattr(self, f"{name}_df")
+
+    def row_count(self, name):
+        """Rows of posts, comments or analysis, counting appended batches."""
+        df = getattr(self, f"{name}_df")
+        return 0 if df is None else len(df) + sum(len(batch) for batch in self.appended[name])
+
+    def _as_frame(self, batch):
+        if batch is None or len(batch) == 0:
+            return None
+        df = pd.DataFrame(batch).reset_index(drop=True)
+        if 'created_utc' in df.columns:
+            df['created_utc'] = pd.to_datetime(df['created_utc'], errors='coerce', utc=True).dt.tz_localize(None)
+        return df
+
+    def _append_comments(self, comments):
+        start = self.row_count("comments")
+        self._append_frame("comments", comments)
+
+        if 'body' in comments.columns:
+            self.word_frequencies.update(self._count_words(comments['body']))
+            self.wordcloud_cache.clear()
+
+        completed = []
+        for position, comment_id in enumerate(comments['id']):
+            if comment_id in self.comment_index:
+                continue  # the first copy of a comment wins, as in _build_comment_index
+            self.comment_index[comment_id] = start + position
+            completed.extend(self.pending_rows.pop(comment_id, []))
+        if not completed or self.table is None:
+            return
+
+        # Fill in the table rows that were waiting for these comments
+        rows = np.sort(np.array(completed, dtype=np.int64))
+        positions = [self.comment_index[comment_id] for comment_id in self.table['comment_id'].iloc[rows]]
+        source = self._frame_rows("comments", ['score', 'created_utc'], positions)
+        self.table.loc[rows, 'comment_row'] = positions
+        self.table.loc[rows, 'score'] = self._clean_numbers(source['score']).to_numpy()
+        self.table.loc[rows, 'created_utc'] = pd.to_datetime(source['created_utc'], errors='coerce').to_numpy()
+        self._add_to_aggregates(rows)
+        self._insert_into_theme_index(rows)
+
+    def _append_analysis(self, analysis):
+        analysis = self._clean_analysis(analysis)
+        start = 0 if self.table is None else len(self.table)
+
+        rows, codes = self._encode_themes(analysis['themes']) if 'themes' in analysis.columns else (
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int16))
+        part = self._table_part(analysis, rows, codes, offset=start)
+
+        # Extend the theme arrays; codes seen for the first time are first seen in this batch
+        grown = len(self.theme_vocab) - len(self.theme_counts)
+        previous_counts = np.r_[self.theme_counts, np.zeros(grown, dtype=np.int64)]
+        self.theme_first_seen = np.r_[self.theme_first_seen, np.zeros(grown, dtype=np.int64)]
+        batch_codes, first_seen = np.unique(codes, return_index=True)
+        unseen = previous_counts[batch_codes] == 0
+        self.theme_first_seen[batch_codes[unseen]] = len(self.theme_codes) + first_seen[unseen]
+        self.theme_counts = previous_counts + np.bincount(codes, minlength=len(self.theme_vocab))
+        self.theme_rows = np.r_[self.theme_rows, (rows + start).astype(np.int32)]
+        self.theme_offsets = np.r_[self.theme_offsets[:-1],
+                                   self._theme_offsets(rows, len(analysis), self.theme_offsets[-1])]
+        self.theme_codes = np.r_[self.theme_codes, codes]
+
+        self._append_frame("analysis", analysis)
+        if self.table is None:
+            self.table = part
+        else:
+            # Keep sentiment categorical across batches with new labels
+            categories = self.table['sentiment'].cat.categories.union(part['sentiment'].cat.categories)
+            self.table['sentiment'] = self.table['sentiment'].cat.set_categories(categories)
+            part['sentiment'] = part['sentiment'].cat.set_categories(categories)
+            self.table = pd.concat([self.table, part], ignore_index=True)
+
+        new_rows = np.arange(start, start + len(part))
+        self._add_to_aggregates(new_rows)
+        self._insert_into_theme_index(new_rows)
 
 # Flask API routes
 processor = DataProcessor()
@@ -360,6 +949,16 @@ def load_data():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/ingest', methods=['POST'])
+def ingest():
+    """Append new posts, comments and analysis rows."""
+    try:
+        data = request.json or {}
+        added = processor.append_data(data.get('posts'), data.get('comments'), data.get('analysis'))
+        return jsonify({"added": added})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/api/trending-topics', methods=['GET'])
 def trending_topics():
     """Get trending topics."""
@@ -374,7 +973,11 @@ def trending_topics():
 def sentiment_over_time():
     try:
         time_period = request.args.get('period', default='day')
-        sentiment_data = processor.get_sentiment_over_time(time_period=time_period)
+        sentiment_data = processor.get_sentiment_over_time(
+            time_period=time_period,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            theme=request.args.get('theme'))
         return jsonify(sentiment_data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -385,7 +988,12 @@ def top_comments():
     try:
         limit = request.args.get('limit', default=10, type=int)
         sort_by = request.args.get('sort_by', default='score')
-        comments = processor.get_top_comments(limit=limit, sort_by=sort_by)
+        comments = processor.get_top_comments(
+            limit=limit,
+            sort_by=sort_by,
+            after=request.args.get('after'),
+            theme=request.args.get('theme'),
+            sentiment=request.args.get('sentiment'))
         return jsonify(comments)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -405,6 +1013,11 @@ def wordcloud():
     try:
         width = request.args.get('width', default=800, type=int)
         height = request.args.get('height', default=400, type=int)
+        if request.args.get('format') == 'png':
+            png = processor.generate_wordcloud(width=width, height=height, as_png=True)
+            if png:
+                return Response(png, mimetype='image/png')
+            return jsonify({"error": "Could not generate word cloud"}), 500
         image = processor.generate_wordcloud(width=width, height=height)
         if image:
             return jsonify({"image": image})
@@ -433,13 +1046,13 @@ def status():
         }
         
         if processor.posts_df is not None:
-            data_status["post_count"] = len(processor.posts_df)
+            data_status["post_count"] = processor.row_count("posts")
         
         if processor.comments_df is not None:
-            data_status["comment_count"] = len(processor.comments_df)
+            data_status["comment_count"] = processor.row_count("comments")
         
         if processor.analysis_df is not None:
-            data_status["analyzed_comment_count"] = len(processor.analysis_df)
+            data_status["analyzed_comment_count"] = processor.row_count("analysis")
         
         return jsonify(data_status)
     except Exception as e:
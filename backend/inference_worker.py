@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised when a comment is submitted while the inference queue is at its maximum depth."""
+
+
+class InferenceWorker:
+    """Runs FeedbackAnalyzer on a dedicated thread, grouping concurrent requests into micro-batches.
+
+    Requests wait in a bounded queue. The worker takes the first waiting request, then keeps
+    collecting more for up to batch_window_ms (or until max_batch_size) and analyzes them with a
+    single analyze_comments call. The analyzer is created on the worker thread the first time it
+    is needed, so loading the model never blocks the caller.
+    """
+
+    def __init__(self, analyzer_factory, max_batch_size=8, batch_window_ms=20, max_queue_size=64):
+        self.analyzer_factory = analyzer_factory
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.requests = queue.Queue(maxsize=max_queue_size)
+        self.batches_run = 0
+        self.comments_analyzed = 0
+        self.rejected = 0
+
+        self.thread = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, comment_text):
+        """Queue a comment for analysis and return a concurrent.futures.Future for the result."""
+        future = Future()
+        try:
+            self.requests.put_nowait((comment_text, future))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self.requests.maxsize} waiting)")
+        return future
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the window closes or the batch is full."""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Requests whose caller already gave up (e.g. the client disconnected) are dropped
+            batch = [(text, future) for text, future in self._collect_batch()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.analyzer_factory().analyze_comments([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self.batches_run += 1
+            self.comments_analyzed += len(batch)
+
+    def stats(self):
+        """Queue depth and throughput counters."""
+        return {
+            "queue_depth": self.requests.qsize(),
+            "max_queue_size": self.requests.maxsize,
+            "batches_run": self.batches_run,
+            "comments_analyzed": self.comments_analyzed,
+            "average_batch_size": round(self.comments_analyzed / self.batches_run, 2) if self.batches_run else 0.0,
+            "rejected": self.rejected,
+        }
@@ -1,76 +1,197 @@
 import pandas as pd
 import json
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList
 import torch
 from tqdm import tqdm
 import re
+import copy
+import hashlib
+import os
+import shutil
+from categories import SENTIMENT_CATEGORIES, THEME_CATEGORIES
+from analysis_cache import AnalysisCache, normalize_text
+
+# The fixed instructions come before the comment so their KV cache can be computed once and reused
+PROMPT_PREFIX = """Analyze the gaming-related comment below and classify it.
+
+Respond in strict JSON format with these keys only:
+{
+"sentiment": "one of: very negative, negative, neutral, positive, very positive",
+"sentiment_score": "number from -1.0 to 1.0",
+"themes": ["choose at least one relevant theme from: bugs/technical issues, game balance, gameplay mechanics, new features/content, monetization, community/social aspects, user interface, performance, praise/appreciation"],
+"summary": "brief one-sentence summary of the comment"
+}
+
+If the comment is vague or unclear, still choose the most likely theme.
+Do not leave 'themes' empty unless it's absolutely meaningless.
+Only respond with a JSON object.
+
+Comment:
+"""
+
+FAILED_SUMMARY = "Failed to analyze comment"
+
+NUMBER_PREFIX = re.compile(r'^-?\d*\.?\d*$')
+NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """Stop each sequence in a batch as soon as the first JSON object it generates is closed."""
+
+    def __init__(self, tokenizer, prompt_length, batch_size):
+        self.tokenizer = tokenizer
+        self.scanned_length = prompt_length
+        self.depth = [0] * batch_size
+        self.in_string = [False] * batch_size
+        self.escaped = [False] * batch_size
+        self.done = [False] * batch_size
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Only the tokens added since the previous step need to be scanned
+        new_tokens = input_ids[:, self.scanned_length:].tolist()
+        self.scanned_length = input_ids.shape[1]
+        for row, tokens in enumerate(new_tokens):
+            if not self.done[row]:
+                self._scan(row, self.tokenizer.decode(tokens))
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
+    def _scan(self, row, text):
+        """Track brace depth outside of JSON strings for one sequence."""
+        for char in text:
+            if self.in_string[row]:
+                if self.escaped[row]:
+                    self.escaped[row] = False
+                elif char == '\\':
+                    self.escaped[row] = True
+                elif char == '"':
+                    self.in_string[row] = False
+            elif char == '"' and self.depth[row] > 0:
+                self.in_string[row] = True
+            elif char == '{':
+                self.depth[row] += 1
+            elif char == '}' and self.depth[row] > 0:
+                self.depth[row] -= 1
+                if self.depth[row] == 0:
+                    self.done[row] = True
+                    return
+
 
 class FeedbackAnalyzer:
-    def __init__(self, model_name="EleutherAI/gpt-neo-125M", device="cuda"):
+    def __init__(self, model_name="EleutherAI/gpt-neo-125M", device="cuda", num_threads=None,
+                 constrained=False, max_summary_tokens=48, cache_path=None,
+                 cpu_dtype="float32", weights_cache_dir=None):
         """
         Initialize the feedback analyzer with a local LLM.
         
         Args:
             model_name: Hugging Face model ID for the LLM
             device: 'cuda' for GPU or 'cpu' for CPU
+            num_threads: Number of CPU threads torch may use (None keeps the torch default)
+            constrained: Fill the fixed JSON schema and only let the model pick the values
+                (sentiment and themes from the known categories, a numeric score and a summary)
+            max_summary_tokens: Upper bound on the summary length in constrained mode
+            cache_path: SQLite file for caching analyses by comment text (None disables the cache)
+            cpu_dtype: Weights to run with on CPU: 'float32', 'bfloat16' or 'int8' (dynamic quantization)
+            weights_cache_dir: Directory for a converted (float16, bfloat16 or int8) local copy of the model
+                and tokenizer, so later startups load it straight from disk instead of converting again
+                (None disables it; float32 weights are never copied)
         """
         self.device = "cuda" if torch.cuda.is_available() and device == "cuda" else "cpu"
         print(f"Using device: {self.device}")
+        if num_threads:
+            torch.set_num_threads(num_threads)
         
         # Load model and tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name, 
-            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-            low_cpu_mem_usage=True
-        ).to(self.device)
+        self.weights_dtype = "float16" if self.device == "cuda" else cpu_dtype
+        self._load_model(model_name, weights_cache_dir)
+        # Batched generation needs a pad token, and left padding so every comment ends at the same position
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
         
         # Define sentiment and theme categories
-        self.sentiment_categories = ["very negative", "negative", "neutral", "positive", "very positive"]
-        self.theme_categories = [
-            "bugs/technical issues", 
-            "game balance", 
-            "gameplay mechanics", 
-            "new features/content",
-            "monetization", 
-            "community/social aspects", 
-            "user interface",
-            "performance",
-            "praise/appreciation"
-        ]
-    
-    def analyze_comment(self, comment_text):
-        """Analyze a single comment for sentiment and themes."""
-        # Create prompt for the LLM
-        prompt = f"""Analyze this gaming-related comment and classify it:
+        self.sentiment_categories = list(SENTIMENT_CATEGORIES)
+        self.theme_categories = list(THEME_CATEGORIES)
 
-        "{comment_text}"
+        self.constrained = constrained
+        self.max_summary_tokens = max_summary_tokens
+        self._number_tokens = None
+        self._comma_token = None
 
-        Respond in strict JSON format with these keys only:
-        {{
-        "sentiment": "one of: very negative, negative, neutral, positive, very positive",
-        "sentiment_score": "number from -1.0 to 1.0",
-        "themes": ["choose at least one relevant theme from: bugs/technical issues, game balance, gameplay mechanics, new features/content, monetization, community/social aspects, user interface, performance, praise/appreciation"],
-        "summary": "brief one-sentence summary of the comment"
-        }}
+        self._cache_prompt_prefix()
 
-        If the comment is vague or unclear, still choose the most likely theme.
-        Do not leave 'themes' empty unless it's absolutely meaningless.
-        Only respond with a JSON object.
-        """
-        # Generate response from the model
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=512,
-                temperature=0.1,
-                do_sample=True
+        # The namespace changes with the model, the prompt and the decoding mode, which invalidates old entries
+        prompt_version = hashlib.sha256((PROMPT_PREFIX + self._build_prompt("")).encode("utf-8")).hexdigest()[:12]
+        namespace = f"{model_name}|{self.weights_dtype}|{prompt_version}|{'constrained' if constrained else 'free'}"
+        self.cache = AnalysisCache(cache_path, namespace) if cache_path else None
+
+    def _load_model(self, model_name, weights_cache_dir):
+        """Load the tokenizer and model, preferring an already converted copy in weights_cache_dir."""
+        if self.weights_dtype not in ("float16", "float32", "bfloat16", "int8"):
+            raise ValueError(f"Unsupported cpu_dtype: {self.weights_dtype}")
+
+        local_dir = None
+        # float32 is what the checkpoints ship as, so a converted copy would only duplicate the HF cache
+        if weights_cache_dir and self.weights_dtype != "float32":
+            # Quantized models are pickled whole, which is only safe to reload with the same torch version
+            suffix = f"int8-torch{torch.__version__}" if self.weights_dtype == "int8" else self.weights_dtype
+            local_dir = os.path.join(weights_cache_dir, f"{model_name.replace('/', '--')}-{suffix}")
+
+        if local_dir and os.path.isdir(local_dir):
+            self.tokenizer = AutoTokenizer.from_pretrained(local_dir, local_files_only=True)
+            if self.weights_dtype == "int8":
+                self.model = torch.load(os.path.join(local_dir, "model.pt"), weights_only=False)
+            else:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    local_dir,
+                    torch_dtype=getattr(torch, self.weights_dtype),
+                    low_cpu_mem_usage=True,
+                    local_files_only=True
+                )
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model = AutoModelForCausalLM.from_pretrained(
+                model_name, 
+                # int8 is quantized from the float32 weights below
+                torch_dtype=torch.float32 if self.weights_dtype == "int8" else getattr(torch, self.weights_dtype),
+                low_cpu_mem_usage=True
             )
+            if self.weights_dtype == "int8":
+                # Linear layers hold nearly all the weights; activations are quantized on the fly
+                self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
 
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            if local_dir:
+                # Write next to the final location first, so a half-written copy is never picked up
+                tmp_dir = f"{local_dir}.tmp{os.getpid()}"
+                self.tokenizer.save_pretrained(tmp_dir)
+                if self.weights_dtype == "int8":
+                    torch.save(self.model, os.path.join(tmp_dir, "model.pt"))
+                else:
+                    self.model.save_pretrained(tmp_dir)
+                try:
+                    os.rename(tmp_dir, local_dir)
+                except OSError:
+                    # Another process stored the same model first
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
 
-        # Extract JSON from response
+        self.model = self.model.to(self.device)
+        self.model.eval()
+
+    def _cache_prompt_prefix(self):
+        """Run the fixed instructions through the model once and keep their past key values."""
+        self.prefix_ids = self.tokenizer(PROMPT_PREFIX, return_tensors="pt")["input_ids"].to(self.device)
+        with torch.no_grad():
+            self.prefix_cache = self.model(self.prefix_ids, use_cache=True).past_key_values
+    
+    def _build_prompt(self, comment_text):
+        """Build the part of the prompt that follows the cached instructions."""
+        return f""""{comment_text}"
+
+JSON:
+"""
+
+    def _parse_response(self, response):
+        """Extract the JSON analysis from the generated text."""
         try:
             json_text = re.search(r'\{.*\}', response, re.DOTALL)
             if json_text:
@@ -81,39 +202,216 @@ class FeedbackAnalyzer:
                     "sentiment": "neutral",
                     "sentiment_score": 0.0,
                     "themes": ["unknown"],
-                    "summary": "Failed to analyze comment"
+                    "summary": FAILED_SUMMARY
                 }
         except json.JSONDecodeError:
             return {
                 "sentiment": "neutral",
                 "sentiment_score": 0.0,
                 "themes": ["parse_error"],
-                "summary": "Failed to analyze comment"
+                "summary": FAILED_SUMMARY
             }
 
-    
+    def analyze_comment(self, comment_text):
+        """Analyze a single comment for sentiment and themes."""
+        return self.analyze_comments([comment_text])[0]
+
+    def analyze_comments(self, comment_texts):
+        """Analyze several comments, running the model only for texts that aren't cached."""
+        if self.cache is None:
+            return self._run_model(comment_texts)
+
+        analyses = self.cache.get_many(comment_texts)
+        # Texts that normalize to the same cache entry are analyzed once
+        missing = list(dict.fromkeys(normalize_text(text) for text in comment_texts if text not in analyses))
+        if missing:
+            computed = dict(zip(missing, self._run_model(missing)))
+            # Failed parses aren't cached so the comment gets another try next time
+            self.cache.put_many((text, analysis) for text, analysis in computed.items()
+                                if not (isinstance(analysis, dict) and analysis.get("summary") == FAILED_SUMMARY))
+            for text in comment_texts:
+                if text not in analyses:
+                    analyses[text] = computed[normalize_text(text)]
+
+        # Callers add metadata to the results, so duplicates must not share one dict
+        return [copy.deepcopy(analyses[text]) for text in comment_texts]
+
+    def _run_model(self, comment_texts):
+        """Analyze several comments with a single padded generate call."""
+        if self.constrained:
+            return [self._analyze_constrained(comment_text) for comment_text in comment_texts]
+
+        prompts = [self._build_prompt(comment_text) for comment_text in comment_texts]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+
+        # Put the cached instructions in front of every comment; the padding ends up between
+        # the two and is masked out, so the prefix keeps the positions it was cached with
+        batch_size = len(prompts)
+        input_ids = torch.cat([self.prefix_ids.expand(batch_size, -1), inputs["input_ids"]], dim=1)
+        attention_mask = torch.cat([
+            torch.ones((batch_size, self.prefix_ids.shape[1]), dtype=inputs["attention_mask"].dtype, device=self.device),
+            inputs["attention_mask"]
+        ], dim=1)
+
+        # generate extends the cache in place, so each call works on its own copy
+        past_key_values = copy.deepcopy(self.prefix_cache)
+        past_key_values.batch_repeat_interleave(batch_size)
+
+        # Generate responses from the model for the whole batch at once; only the comment tokens are prefilled
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                max_new_tokens=512,
+                temperature=0.1,
+                do_sample=True,
+                pad_token_id=self.tokenizer.pad_token_id,
+                # Nothing after the closing brace is used, so stop there instead of at max_new_tokens
+                stopping_criteria=StoppingCriteriaList([
+                    JsonObjectStoppingCriteria(self.tokenizer, input_ids.shape[1], batch_size)
+                ])
+            )
+
+        # Only decode the generated continuation, not the prompt (which contains a JSON template itself)
+        generated = outputs[:, input_ids.shape[1]:]
+        responses = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        return [self._parse_response(response) for response in responses]
+
+    def _feed(self, text, cache):
+        """Run text through the model on top of the cache and return the next-token logits."""
+        input_ids = self.tokenizer(text, return_tensors="pt")["input_ids"].to(self.device)
+        return self._feed_ids(input_ids, cache)
+
+    def _feed_ids(self, input_ids, cache):
+        with torch.no_grad():
+            return self.model(input_ids, past_key_values=cache, use_cache=True).logits[0, -1]
+
+    def _choose(self, options, logits, cache):
+        """Greedily pick one of the options, only allowing tokens that continue one of them.
+
+        Options must be prefix-free (e.g. end with a closing quote). Returns the option and the
+        logits after its last token.
+        """
+        candidates = {option: self.tokenizer(option)["input_ids"] for option in options}
+        step = 0
+        while True:
+            # Once a single option is left, the rest of it is forced and fed in one go
+            if len(candidates) == 1:
+                option, token_ids = next(iter(candidates.items()))
+                if step < len(token_ids):
+                    logits = self._feed_ids(torch.tensor([token_ids[step:]], device=self.device), cache)
+                return option, logits
+
+            allowed = sorted({token_ids[step] for token_ids in candidates.values()})
+            token = allowed[int(torch.argmax(logits[allowed]))]
+            candidates = {option: token_ids for option, token_ids in candidates.items() if token_ids[step] == token}
+            logits = self._feed_ids(torch.tensor([[token]], device=self.device), cache)
+            step += 1
+
+    def _generate_number(self, logits, cache, max_tokens=6):
+        """Greedily generate a number, only allowing tokens that keep it a valid numeric literal."""
+        if self._number_tokens is None:
+            # Scanned once: every token that decodes to digits, '-' or '.'
+            decoded = self.tokenizer.batch_decode([[token] for token in range(len(self.tokenizer))])
+            self._number_tokens = [(token, text) for token, text in enumerate(decoded)
+                                   if text and NUMBER_PREFIX.match(text)]
+            self._comma_token = self.tokenizer(",")["input_ids"][0]
+
+        number = ""
+        for _ in range(max_tokens):
+            allowed = [(token, text) for token, text in self._number_tokens if NUMBER_PREFIX.match(number + text)]
+            if not allowed:
+                break
+            token_ids = [token for token, _ in allowed]
+            best = int(torch.argmax(logits[token_ids]))
+            # Stop once the number is complete and the model would rather end it than extend it
+            if NUMBER.match(number) and logits[token_ids[best]] < logits[self._comma_token]:
+                break
+            number += allowed[best][1]
+            logits = self._feed_ids(torch.tensor([[token_ids[best]]], device=self.device), cache)
+        return number
+
+    def _generate_string(self, logits, cache, max_tokens):
+        """Greedily generate the contents of a JSON string until the model closes it."""
+        tokens = []
+        text = ""
+        for _ in range(max_tokens):
+            token = int(torch.argmax(logits))
+            if token == self.tokenizer.eos_token_id:
+                break
+            tokens.append(token)
+            text = self.tokenizer.decode(tokens)
+            if '"' in text:
+                return text[:text.index('"')]
+            logits = self._feed_ids(torch.tensor([[token]], device=self.device), cache)
+        return text
+
+    def _analyze_constrained(self, comment_text):
+        """Analyze a comment by filling the fixed JSON schema, so the result always parses."""
+        cache = copy.deepcopy(self.prefix_cache)
+
+        logits = self._feed(self._build_prompt(comment_text) + '{"sentiment": "', cache)
+        sentiment, _ = self._choose([f'{category}"' for category in self.sentiment_categories], logits, cache)
+
+        logits = self._feed(', "sentiment_score": ', cache)
+        number = self._generate_number(logits, cache)
+        sentiment_score = max(-1.0, min(1.0, float(number))) if NUMBER.match(number) else 0.0
+
+        # At least one theme, then the model decides between closing the list and adding another
+        logits = self._feed(', "themes": ["', cache)
+        themes = []
+        remaining = list(self.theme_categories)
+        while remaining:
+            theme, logits = self._choose([f'{category}"' for category in remaining], logits, cache)
+            themes.append(theme[:-1])
+            remaining.remove(theme[:-1])
+            if remaining:
+                separator, logits = self._choose([']', ', "'], logits, cache)
+                if separator == ']':
+                    break
+        else:
+            self._feed(']', cache)
+
+        logits = self._feed(', "summary": "', cache)
+        summary = self._generate_string(logits, cache, self.max_summary_tokens)
+
+        return {
+            "sentiment": sentiment[:-1],
+            "sentiment_score": sentiment_score,
+            "themes": themes,
+            "summary": summary.strip()
+        }
+
     def batch_analyze(self, comments_df, text_column="body", batch_size=20):
         """Analyze a batch of comments from a DataFrame."""
+        texts = comments_df[text_column]
+        valid = [pos for pos, comment_text in enumerate(texts)
+                 if isinstance(comment_text, str) and comment_text.strip()]
+
+        # Bucket comments of similar token length together so little compute goes to padding
+        lengths = [len(ids) for ids in self.tokenizer([texts.iat[pos] for pos in valid])["input_ids"]] if valid else []
+        by_length = [valid[i] for i in sorted(range(len(valid)), key=lengths.__getitem__)]
+
+        analyses = {}
+        for i in tqdm(range(0, len(by_length), batch_size)):
+            positions = by_length[i:i+batch_size]
+            batch_results = self.analyze_comments([texts.iat[pos] for pos in positions])
+            analyses.update(zip(positions, batch_results))
+
+        # Results keep the order of the input DataFrame
         results = []
-        
-        # Process in batches to show progress and avoid memory issues
-        for i in tqdm(range(0, len(comments_df), batch_size)):
-            batch = comments_df.iloc[i:i+batch_size]
-            
-            for _, row in batch.iterrows():
-                comment_text = row[text_column]
-                if not isinstance(comment_text, str) or not comment_text.strip():
-                    continue
-                    
-                analysis = self.analyze_comment(comment_text)
-                
-                # Add comment metadata to the analysis
-                analysis['comment_id'] = row.get('id', '')
-                analysis['post_id'] = row.get('post_id', '')
-                analysis['score'] = row.get('score', 0)
-                analysis['created_utc'] = row.get('created_utc', '')
-                
-                results.append(analysis)
+        for pos in valid:
+            row = comments_df.iloc[pos]
+            analysis = analyses[pos]
+
+            # Add comment metadata to the analysis
+            analysis['comment_id'] = row.get('id', '')
+            analysis['post_id'] = row.get('post_id', '')
+            analysis['score'] = row.get('score', 0)
+            analysis['created_utc'] = row.get('created_utc', '')
+
+            results.append(analysis)
         
         return pd.DataFrame(results)
     
@@ -157,7 +455,7 @@ Keep the summary brief but comprehensive.
 
 # Example usage
 if __name__ == "__main__":
-    analyzer = FeedbackAnalyzer()
+    analyzer = FeedbackAnalyzer(cache_path="analysis_cache.sqlite")
 
     # Lue kommentit
     comments_df = pd.read_csv("clash_royale_comments_20250517_150746.csv")  # tai muuta tiedostonimeä
@@ -1,14 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from snapshots import SnapshotManager, LoadInProgressError
+from partitions import DEFAULT_SOURCE
 from dataprocess import DataProcessor
+from shared_dataset import SharedDataset
 from scraper import RedditScraper
 from llm import FeedbackAnalyzer
-from fastapi import HTTPException, Query
-from typing import Optional
-import pandas as pd
-import math
-from fastapi.responses import JSONResponse
+from inference_worker import InferenceWorker, QueueFullError
+from response_cache import ResponseCache
+from serialization import FORMATS, MIN_COMPRESS_SIZE, compress, encode, negotiate_encoding
+from fastapi import HTTPException, Query, Request
+from typing import Any, Dict, List, Optional
+import os
+import asyncio
+import threading
+import time
+from fastapi.responses import JSONResponse, Response
 
 app = FastAPI()
 origins = [
@@ -16,9 +24,16 @@ origins = [
     "http://127.0.0.1:5173"
 ]
 # Initialize tools
-processor = DataProcessor()
-scraper = RedditScraper("ClashRoyale")
+# Requests read snapshots.current; /api/load-data swaps in a new snapshot without blocking them
+snapshots = SnapshotManager()
+# With several uvicorn workers, SHARED_DATA_DIR makes them all serve one dataset published there
+shared_dataset = SharedDataset(os.environ["SHARED_DATA_DIR"]) if os.getenv("SHARED_DATA_DIR") else None
+# Dashboard responses, reused until the data version changes
+response_cache = ResponseCache(max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "256")))
+scraper = RedditScraper(DEFAULT_SOURCE)
 feedback_analyzer = None
+analyzer_lock = threading.Lock()
+model_status = {"state": "not_loaded"}
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,87 +47,266 @@ app.add_middleware(
 #print("Model response:", response)
 def get_feedback_analyzer():
     global feedback_analyzer
-    if feedback_analyzer is None:
-        feedback_analyzer = FeedbackAnalyzer()
+    # Called from the warm-up thread and the inference worker, so only one of them may load the model
+    with analyzer_lock:
+        if feedback_analyzer is None:
+            model_status.update(state="loading")
+            started = time.perf_counter()
+            try:
+                feedback_analyzer = FeedbackAnalyzer(
+                    cache_path=os.getenv("ANALYSIS_CACHE_PATH", "analysis_cache.sqlite"),
+                    cpu_dtype=os.getenv("MODEL_CPU_DTYPE", "float32"),
+                    weights_cache_dir=os.getenv("MODEL_CACHE_DIR"),
+                )
+            except Exception as e:
+                model_status.update(state="failed", error=str(e))
+                raise
+            model_status.update(state="ready", load_seconds=round(time.perf_counter() - started, 2))
     return feedback_analyzer
+
+@app.on_event("startup")
+async def warm_load_model():
+    """Optionally load the model in the background as soon as the app starts."""
+    if os.getenv("WARM_LOAD_MODEL", "0") == "1":
+        threading.Thread(target=get_feedback_analyzer, name="model-warm-load", daemon=True).start()
+
+async def append_on_loop(source, posts=None, comments=None, analysis=None):
+    return snapshots.append(posts, comments, analysis, source=source)
+
+def shared_append(loop):
+    """The append callback for SharedDataset; deltas are applied on the event loop thread, like /api/ingest."""
+    def append(source, **batch):
+        asyncio.run_coroutine_threadsafe(append_on_loop(source, **batch), loop).result()
+    return append
+
+@app.on_event("startup")
+async def watch_shared_dataset():
+    """In shared mode, follow the manifest so this worker serves the same data as all the others."""
+    if shared_dataset is None:
+        return
+    poll_seconds = float(os.getenv("SHARED_POLL_SECONDS", "1.0"))
+    threading.Thread(
+        target=shared_dataset.watch, args=(snapshots, shared_append(asyncio.get_running_loop()), poll_seconds),
+        name="shared-dataset-watch", daemon=True).start()
+
+# Model inference runs on its own thread so it never blocks the event loop
+inference_worker = InferenceWorker(
+    get_feedback_analyzer,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8")),
+    batch_window_ms=float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "20")),
+    max_queue_size=int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", "64")),
+)
 # CORS settings - allow all origins (relax this for production!)
 
 class LoadRequest(BaseModel):
     posts_file: str
     comments_file: str
     analysis_file: Optional[str] = None
+    # Source (subreddit) the files belong to; other sources stay loaded
+    source: str = DEFAULT_SOURCE
+    # With wait=False the call returns right away; poll /api/status for progress
+    wait: bool = True
 
 @app.post("/api/load-data")
 async def load_data(req: LoadRequest):
+    if shared_dataset is not None:
+        return await load_shared_data(req)
+    try:
+        future = snapshots.start_load(req.posts_file, req.comments_file, req.analysis_file, source=req.source)
+    except LoadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not req.wait:
+        return JSONResponse(status_code=202, content={"status": "Data load started"})
     try:
-        processor.load_data(req.posts_file, req.comments_file, req.analysis_file)
-        return {"status": "Data loaded successfully"}
+        version = await asyncio.wrap_future(future)
+        return {"status": "Data loaded successfully", "version": version}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def load_shared_data(req):
+    """Publish the files for every worker; this worker then picks them up like the others."""
+    loop = asyncio.get_running_loop()
+    def publish_and_sync():
+        shared_dataset.publish_load(req.source, req.posts_file, req.comments_file, req.analysis_file)
+        return shared_dataset.sync(snapshots, shared_append(loop))
+
+    if not req.wait:
+        def run():
+            try:
+                publish_and_sync()
+            except Exception as e:
+                print(f"Shared data load failed: {e}")
+        threading.Thread(target=run, name="shared-load", daemon=True).start()
+        return JSONResponse(status_code=202, content={"status": "Data load started"})
+    try:
+        version = await asyncio.to_thread(publish_and_sync)
+        return {"status": "Data loaded successfully", "version": version}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class IngestRequest(BaseModel):
+    posts: List[Dict[str, Any]] = []
+    comments: List[Dict[str, Any]] = []
+    analysis: List[Dict[str, Any]] = []
+    source: str = DEFAULT_SOURCE
+
+@app.post("/api/ingest")
+async def ingest(req: IngestRequest):
+    """Append a small batch of new posts, comments and analysis rows without reloading files."""
+    if shared_dataset is not None:
+        try:
+            # Appended to an empty processor first: a batch that fails here would fail in every worker
+            DataProcessor().append_data(req.posts, req.comments, req.analysis)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        loop = asyncio.get_running_loop()
+        await asyncio.to_thread(shared_dataset.publish_append, req.source, req.posts, req.comments, req.analysis)
+        version = await asyncio.to_thread(shared_dataset.sync, snapshots, shared_append(loop))
+        added = {"posts": len(req.posts), "comments": len(req.comments), "analysis": len(req.analysis)}
+        return {"added": added, "version": version}
+    try:
+        added, version = snapshots.append(req.posts, req.comments, req.analysis, source=req.source)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"added": added, "version": version}
+
+def cached_json(request, endpoint, params, compute, fmt=None):
+    """Serve compute(processor) through the response cache, answering 304 when the client's ETag matches.
+
+    Responses are cached per data version, so loading or ingesting data invalidates them.
+    ?format= picks JSON (default), NDJSON or an Arrow IPC stream, and large bodies are sent
+    brotli- or gzip-compressed when the client accepts it; every variant is cached separately.
+    """
+    fmt = fmt or request.query_params.get("format", "json")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    processor, version = snapshots.snapshot()
+    params = dict(params, format=fmt)
+    body, etag = cached_body(version, endpoint, params, lambda: encode(compute(processor), fmt))
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        body, etag = cached_body(version, endpoint, dict(params, encoding=encoding), lambda: compress(body, encoding))
+        headers.update({"ETag": etag, "Content-Encoding": encoding})
+
+    if etag_matches(request, etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=FORMATS[fmt], headers=headers)
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match lists etag (weak or strong) or is *."""
+    client_etags = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    return etag in client_etags or "*" in client_etags
+
+def cached_body(version, endpoint, params, render):
+    """(body, etag) from the response cache, rendering and storing the body on a miss."""
+    entry = response_cache.get(version, endpoint, params)
+    if entry is None:
+        entry = response_cache.put(version, endpoint, params, render())
+    return entry
+
 @app.get("/api/trending-topics")
-async def trending_topics(limit: int = Query(30, ge=1)):
-    return processor.get_trending_topics(limit=limit)
+async def trending_topics(request: Request, limit: int = Query(30, ge=1), source: Optional[str] = None):
+    return cached_json(request, "trending-topics", {"limit": limit, "source": source},
+                       lambda processor: processor.get_trending_topics(limit=limit, source=source))
 
 @app.get("/api/sentiment-over-time")
-async def sentiment_over_time(period: str = Query("day")):
+async def sentiment_over_time(request: Request, period: str = Query("day"), start: Optional[str] = None,
+                              end: Optional[str] = None, theme: Optional[str] = None, source: Optional[str] = None):
+    """Sentiment per period, optionally only between start and end (end exclusive) and for one theme."""
     try:
-        data = processor.get_sentiment_over_time(time_period=period)  # kutsutaan funktiota
-        return JSONResponse(content=data)
+        params = {"period": period, "start": start, "end": end, "theme": theme, "source": source}
+        return cached_json(request, "sentiment-over-time", params, lambda processor: processor.get_sentiment_over_time(
+            time_period=period, start=start, end=end, theme=theme, source=source))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Unparseable start or end
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/top-comments")
-async def top_comments(limit: int = Query(50, ge=1), sort_by: str = Query("score")):
+async def top_comments(request: Request, limit: int = Query(50, ge=1), sort_by: str = Query("score"),
+                       after: Optional[str] = None, theme: Optional[str] = None, sentiment: Optional[str] = None,
+                       source: Optional[str] = None):
+    """One page of top comments; pass after=<value>,<source>,<id> of the previous page's last comment for the next."""
+    params = {"limit": limit, "sort_by": sort_by, "after": after, "theme": theme, "sentiment": sentiment,
+              "source": source}
     try:
-        comments = processor.get_top_comments(limit=limit, sort_by=sort_by)
-        
-        # Tarkista tyyppi ja käsittele NaN
-        if isinstance(comments, pd.DataFrame):
-            comments = comments.where(pd.notnull(comments), None)
-            result = comments.to_dict(orient="records")
-        else:
-            def clean_dict(d):
-                return {k: (None if (isinstance(v, float) and math.isnan(v)) else v) for k, v in d.items()}
-            result = [clean_dict(c) for c in comments]
-
-        return result
+        # The rows come out JSON-ready (no NaN), so they are encoded once, straight from the processor
+        return cached_json(request, "top-comments", params, lambda processor: processor.get_top_comments(
+            limit=limit, sort_by=sort_by, after=after, theme=theme, sentiment=sentiment, source=source))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Malformed cursor
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error in /api/top-comments: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/theme-distribution")
-async def theme_distribution():
-    return processor.get_theme_distribution()
+async def theme_distribution(request: Request, source: Optional[str] = None):
+    return cached_json(request, "theme-distribution", {"source": source},
+                       lambda processor: processor.get_theme_distribution(source=source))
 
 @app.get("/api/wordcloud")
-async def wordcloud(width: int = Query(800, ge=100), height: int = Query(400, ge=100)):
-    image = processor.generate_wordcloud(width=width, height=height)
-    if image:
+async def wordcloud(request: Request, width: int = Query(800, ge=100), height: int = Query(400, ge=100),
+                    format: str = Query("json"), source: Optional[str] = None):
+    """The word cloud as {"image": <data URL>}, or as a raw PNG with format=png."""
+    processor, version = snapshots.snapshot()
+    if format == "png":
+        png = processor.generate_wordcloud(width=width, height=height, as_png=True, source=source)
+        if not png:
+            raise HTTPException(status_code=500, detail="Could not generate word cloud")
+        # Same data and size always give the same image
+        etag = f'"wordcloud-{version}-{source or "all"}-{width}x{height}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=png, media_type="image/png", headers=headers)
+
+    def compute(processor):
+        image = processor.generate_wordcloud(width=width, height=height, source=source)
+        if not image:
+            raise HTTPException(status_code=500, detail="Could not generate word cloud")
         return {"image": image}
-    else:
-        raise HTTPException(status_code=500, detail="Could not generate word cloud")
+
+    # The base64 data URL is large, so it goes through the cache for compression and ETags
+    return cached_json(request, "wordcloud", {"width": width, "height": height, "source": source}, compute, fmt="json")
 
 @app.get("/api/developer-insights")
-async def developer_insights():
-    return processor.get_developer_insights()
+async def developer_insights(request: Request, source: Optional[str] = None):
+    return cached_json(request, "developer-insights", {"source": source},
+                       lambda processor: processor.get_developer_insights(source=source))
 
 @app.get("/api/status")
 async def status():
+    processor = snapshots.current
+    sources = processor.stats()
     data_status = {
-        "posts_loaded": processor.posts_df is not None,
-        "comments_loaded": processor.comments_df is not None,
-        "analysis_loaded": processor.analysis_df is not None,
+        "posts_loaded": any(counts["post_count"] for counts in sources.values()),
+        "comments_loaded": any(counts["comment_count"] for counts in sources.values()),
+        "analysis_loaded": any(counts["analyzed_comment_count"] for counts in sources.values()),
     }
 
-    if processor.posts_df is not None:
-        data_status["post_count"] = len(processor.posts_df)
+    # Totals over all sources, then the counts per source
+    for key in ["post_count", "comment_count", "analyzed_comment_count"]:
+        data_status[key] = sum(counts[key] for counts in sources.values())
+    data_status["sources"] = sources
 
-    if processor.comments_df is not None:
-        data_status["comment_count"] = len(processor.comments_df)
+    data_status["snapshot"] = snapshots.stats()
+    if shared_dataset is not None:
+        data_status["shared_dataset"] = {"directory": shared_dataset.directory, "version": shared_dataset.synced_version}
+    data_status["response_cache"] = response_cache.stats()
+    data_status["model"] = dict(model_status)
+    data_status["inference"] = inference_worker.stats()
 
-    if processor.analysis_df is not None:
-        data_status["analyzed_comment_count"] = len(processor.analysis_df)
+    if feedback_analyzer is not None and feedback_analyzer.cache is not None:
+        data_status["analysis_cache"] = feedback_analyzer.cache.stats()
 
     return data_status
 
@@ -122,10 +316,12 @@ class CommentRequest(BaseModel):
 
 @app.post("/api/analyze-comment")
 async def analyze_comment(req: CommentRequest):
-    analyzer = get_feedback_analyzer()
     try:
-        result = analyzer.analyze_comment(req.text)
-        return result
+        future = inference_worker.submit(req.text)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    try:
+        return await asyncio.wrap_future(future)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -0,0 +1,182 @@
+import heapq
+from collections import Counter, OrderedDict
+import numpy as np
+import pandas as pd
+from dataprocess import DataProcessor, render_wordcloud
+
+# Partition that loads and ingests go to when no source is given
+DEFAULT_SOURCE = "ClashRoyale"
+
+
+class PartitionedProcessor:
+    """DataProcessor data split by source (a subreddit today; YouTube or app store reviews later).
+
+    Every source has its own DataProcessor with its own indexes and aggregates, so a dashboard
+    looking at one game only touches that game's data. The query methods take a source; without
+    one they merge the per-source aggregates (theme counts, hourly rollups, top comment pages)
+    instead of concatenating the underlying frames.
+
+    Loading a source builds a new PartitionedProcessor that shares every other partition
+    (see with_partition), which is what SnapshotManager swaps in.
+    """
+
+    WORDCLOUD_CACHE_SIZE = DataProcessor.WORDCLOUD_CACHE_SIZE
+
+    def __init__(self, partitions=None):
+        self.partitions = dict(partitions or {})  # source -> DataProcessor, in the order they were added
+        self.wordcloud_cache = OrderedDict()  # merged word clouds; (width, height) -> PNG bytes
+
+    def with_partition(self, source, processor):
+        """A new PartitionedProcessor with source replaced by processor and all other partitions shared."""
+        return PartitionedProcessor({**self.partitions, source: processor})
+
+    def append_data(self, posts=None, comments=None, analysis=None, source=None):
+        """Append a batch to one source's partition, creating the partition if it is new."""
+        source = source or DEFAULT_SOURCE
+        processor = self.partitions.get(source)
+        if processor is None:
+            processor = self.partitions[source] = DataProcessor()
+        added = processor.append_data(posts=posts, comments=comments, analysis=analysis)
+        self.wordcloud_cache.clear()
+        return added
+
+    def _selected(self, source=None):
+        """[(source, DataProcessor)] a query runs over; an unknown source selects nothing."""
+        if source is None:
+            return list(self.partitions.items())
+        return [(source, self.partitions[source])] if source in self.partitions else []
+
+    def get_trending_topics(self, limit=30, source=None):
+        selected = self._selected(source)
+        if len(selected) == 1:
+            return selected[0][1].get_trending_topics(limit=limit)
+
+        # Themes where any source has them, otherwise the comment word counts
+        with_analysis = [processor for _, processor in selected if processor.analysis_df is not None]
+        themed = [processor for processor in with_analysis if len(processor.theme_codes) > 0]
+        if themed:
+            totals = Counter()
+            for processor in themed:
+                totals.update(processor.theme_totals())
+            counts = pd.Series(totals, dtype=np.int64)
+        else:
+            parts = [pd.Series(processor.term_counts, index=processor.term_vocab)
+                     for processor in with_analysis if processor.comments_df is not None]
+            if not parts:
+                return []
+            counts = pd.concat(parts).groupby(level=0, sort=False).sum()
+            counts = counts[counts > 0]
+        # Ties keep the order the topics first appeared in, source by source
+        counts = counts.sort_values(ascending=False, kind='stable').head(limit)
+        return [{"theme": theme, "count": int(count)} for theme, count in counts.items()]
+
+    def get_sentiment_over_time(self, time_period='day', start=None, end=None, theme=None, source=None):
+        selected = self._selected(source)
+        if not selected:
+            return []
+        rollups = [rollup for rollup in (processor.hourly_rollup(theme) for _, processor in selected)
+                   if rollup is not None]
+        merged = None
+        for rollup in rollups:
+            merged = rollup if merged is None else merged.add(rollup, fill_value=0)
+        return selected[0][1].rollup_points(merged, time_period, start, end)
+
+    def get_top_comments(self, limit=50, sort_by='score', after=None, theme=None, sentiment=None, source=None):
+        """Top comments of one source, or of all of them merged; each comment is tagged with its source.
+
+        The cursor is "<value>,<source>,<id>" of the previous page's last comment, since the same
+        comment id can exist in several sources. Across sources, comments with the same value are
+        ordered by source, so paging continues in the cursor's source and starts the later ones
+        from the top. With a single source selected, "<value>,<id>" works too.
+        """
+        selected = [(name, processor) for name, processor in self._selected(source)
+                    if processor.table is not None and processor.comments_df is not None]
+        if not selected:
+            return []
+
+        starts = [0] * len(selected)
+        if after is not None:
+            found, value, comment_id = self._parse_cursor(after, selected)
+            for i, (name, processor) in enumerate(selected):
+                lower, upper, past = processor.cursor_bounds(sort_by, f"{value},{comment_id}")
+                if i == found:
+                    starts[i] = upper if past is None else past
+                else:
+                    starts[i] = upper if i < found else lower
+
+        column = 'sentiment_score' if sort_by == 'sentiment' else 'score'
+        pages, candidates = [], []
+        for i, ((name, processor), start) in enumerate(zip(selected, starts)):
+            rows = processor.page_rows(limit, sort_by, start, theme, sentiment)
+            values = processor.table[column].to_numpy(dtype=np.float64)[rows]
+            pages.append(rows)
+            candidates.append([(-value, i, position) for position, value in enumerate(values)])
+        chosen = list(heapq.merge(*candidates))[:limit]
+
+        # Every source contributes a prefix of its page
+        records = []
+        for i, ((name, processor), rows) in enumerate(zip(selected, pages)):
+            taken = sum(1 for _, source_index, _ in chosen if source_index == i)
+            records.append([dict(record, source=name) for record in processor.comment_records(rows[:taken])])
+        return [records[i][position] for _, i, position in chosen]
+
+    @staticmethod
+    def _parse_cursor(after, selected):
+        """(index in selected of the cursor's source, value, comment id) for a top-comments cursor."""
+        parts = str(after).split(',', 2)
+        if len(parts) == 3:
+            names = [name for name, _ in selected]
+            if parts[1] not in names:
+                raise ValueError(f"Cursor source {parts[1]!r} is not selected")
+            return names.index(parts[1]), parts[0], parts[2]
+        if len(parts) == 2 and len(selected) == 1:
+            return 0, parts[0], parts[1]
+        raise ValueError("Cursor must be <value>,<source>,<id>")
+
+    def get_theme_distribution(self, source=None):
+        selected = [processor for _, processor in self._selected(source) if processor.analysis_df is not None]
+        if not selected:
+            return {}
+        totals = Counter()
+        for processor in selected:
+            totals.update(processor.theme_totals())
+        return DataProcessor.theme_percentages(totals)
+
+    def generate_wordcloud(self, width=800, height=400, as_png=False, source=None):
+        selected = [processor for _, processor in self._selected(source) if processor.comments_df is not None]
+        if not selected:
+            return None
+        if len(selected) == 1:
+            return selected[0].generate_wordcloud(width=width, height=height, as_png=as_png)
+
+        frequencies = Counter()
+        for processor in selected:
+            frequencies.update(processor.word_frequencies)
+        return render_wordcloud(frequencies, width, height, self.wordcloud_cache, as_png, self.WORDCLOUD_CACHE_SIZE)
+
+    def get_developer_insights(self, limit=5, source=None):
+        selected = self._selected(source)
+        per_source = [(name, processor.get_developer_insights(limit=limit)) for name, processor in selected]
+        per_source = [(name, insights) for name, insights in per_source if insights]
+        if not per_source:
+            return {}
+
+        # Each source's list is already sorted by score, so merging keeps the best ones of all
+        insights = {}
+        for category_name in DataProcessor.developer_categories:
+            ranked = heapq.merge(*([dict(comment, source=name) for comment in source_insights.get(category_name, [])]
+                                   for name, source_insights in per_source),
+                                 key=lambda comment: -comment["score"])
+            insights[category_name] = list(ranked)[:limit]
+        return insights
+
+    def stats(self):
+        """Row counts per source."""
+        return {
+            source: {
+                "post_count": processor.row_count("posts"),
+                "comment_count": processor.row_count("comments"),
+                "analyzed_comment_count": processor.row_count("analysis"),
+            }
+            for source, processor in self.partitions.items()
+        }
@@ -0,0 +1,227 @@
+import os
+import queue
+import threading
+import time
+import pandas as pd
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from scrape_store import ScrapeStore
+from scraper import RedditScraper
+from vader_analysis import score_comments
+
+# Marks the end of the stream on a stage's input queue
+_DONE = object()
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.chunks = 0
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # time spent waiting for room in the next stage's queue
+
+    def stats(self, inbox=None):
+        return {
+            "chunks": self.chunks,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "items_per_second": round(self.items_out / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            "queue_depth": inbox.qsize() if inbox is not None else 0,
+        }
+
+
+class StreamingPipeline:
+    """Streams comments from RedditScraper through VADER (and optionally FeedbackAnalyzer) into a ScrapeStore.
+
+    Every stage runs on its own thread and hands chunks of at most chunk_size comments to the
+    next one through a queue holding at most queue_size chunks. A slow stage therefore makes the
+    stages before it wait instead of piling up comments in memory. Comments are scored and stored
+    as each submission finishes downloading, not after the whole scrape.
+    """
+
+    def __init__(self, scraper, store, analyzer=None, chunk_size=64, queue_size=4, on_chunk=None):
+        self.scraper = scraper
+        self.store = store
+        self.analyzer = analyzer
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        # Called with (comments, analyses) after every stored chunk, e.g. to update a live dashboard
+        self.on_chunk = on_chunk
+        self.vader = SentimentIntensityAnalyzer()
+        self.metrics = {}
+        self.queues = {}
+
+    def run(self, post_limit=25, comment_limit=None):
+        """Run one incremental pass over the hot posts and return the per-stage stats."""
+        stages = [("sentiment", self._score_sentiment)]
+        if self.analyzer is not None:
+            stages.append(("llm", self._analyze_llm))
+        stages.append(("store", self._store))
+
+        self.metrics = {name: StageMetrics(name) for name in ["scrape"] + [name for name, _ in stages]}
+        self.queues = {}
+        self.stop = threading.Event()
+        self.errors = []
+
+        threads = []
+        outbox = None
+        for name, process in reversed(stages):
+            inbox = queue.Queue(maxsize=self.queue_size)
+            self.queues[name] = inbox
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(self.metrics[name], process, inbox, outbox),
+                name=f"pipeline-{name}", daemon=True))
+            outbox = inbox
+        threads.append(threading.Thread(
+            target=self._scrape, args=(outbox, post_limit, comment_limit), name="pipeline-scrape", daemon=True))
+
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+        stats = self.stats()
+        print(f"Pipeline stored {stats['store']['items_out']} analyses in {time.monotonic() - started:.1f}s")
+        return stats
+
+    def run_forever(self, interval_seconds=300, **run_kwargs):
+        """Repeat run() every interval_seconds; a failed pass is logged and retried next time."""
+        while True:
+            started = time.monotonic()
+            try:
+                self.run(**run_kwargs)
+            except Exception as e:
+                print(f"Pipeline run failed: {e}")
+            time.sleep(max(0.0, interval_seconds - (time.monotonic() - started)))
+
+    def stats(self):
+        """Per-stage counters, plus how many chunks are waiting in front of each stage."""
+        return {name: metrics.stats(self.queues.get(name)) for name, metrics in self.metrics.items()}
+
+    def _put(self, outbox, item, metrics):
+        """Block until the next stage has room; give up if a stage failed and the pipeline is stopping."""
+        waited_since = time.monotonic()
+        while not self.stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        metrics.blocked_seconds += time.monotonic() - waited_since
+
+    def _scrape(self, outbox, post_limit, comment_limit):
+        metrics = self.metrics["scrape"]
+        pending = []
+        try:
+            started = time.monotonic()
+            for comments in self._iter_comments(post_limit, comment_limit):
+                if self.stop.is_set():
+                    break
+                metrics.busy_seconds += time.monotonic() - started
+                metrics.items_in += len(comments)
+                if not comments.empty:
+                    pending.append(comments)
+                # Re-chunk so small submissions are batched together and big ones are split
+                while sum(len(part) for part in pending) >= self.chunk_size:
+                    buffered = pd.concat(pending, ignore_index=True)
+                    pending = [buffered.iloc[self.chunk_size:]]
+                    self._emit(outbox, buffered.iloc[:self.chunk_size], metrics)
+                started = time.monotonic()
+            pending = [part for part in pending if not part.empty]
+            if pending and not self.stop.is_set():
+                self._emit(outbox, pd.concat(pending, ignore_index=True), metrics)
+        except Exception as e:
+            self._fail("scrape", e)
+        finally:
+            self._put(outbox, _DONE, metrics)
+
+    def _iter_comments(self, post_limit, comment_limit):
+        """Stored comments that were never analyzed first, then the newly scraped ones."""
+        backlog = self.store.unanalyzed_comment_ids()
+        for start in range(0, len(backlog), self.chunk_size):
+            yield self.store.load_comments(backlog[start:start + self.chunk_size])
+
+        posts = self.scraper.get_hot_posts(limit=post_limit)
+        if posts.empty:
+            return
+        # Comments already in the backlog would otherwise be scored twice
+        skip = set(backlog)
+        for _, comments in self.scraper.iter_post_comments(posts, comment_limit, self.store):
+            yield comments[~comments['id'].isin(skip)] if skip and not comments.empty else comments
+
+    def _emit(self, outbox, comments, metrics):
+        metrics.chunks += 1
+        metrics.items_out += len(comments)
+        self._put(outbox, (comments.reset_index(drop=True), None), metrics)
+
+    def _run_stage(self, metrics, process, inbox, outbox):
+        while not self.stop.is_set():
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                if outbox is not None:
+                    self._put(outbox, _DONE, metrics)
+                return
+
+            comments, analyses = item
+            started = time.monotonic()
+            try:
+                analyses = process(comments, analyses)
+            except Exception as e:
+                self._fail(metrics.name, e)
+                return
+            metrics.busy_seconds += time.monotonic() - started
+            metrics.chunks += 1
+            metrics.items_in += len(comments)
+            metrics.items_out += len(analyses)
+            if outbox is not None:
+                self._put(outbox, (comments, analyses), metrics)
+
+    def _fail(self, stage, error):
+        print(f"Pipeline stage {stage} failed: {error}")
+        self.errors.append(error)
+        self.stop.set()
+
+    def _score_sentiment(self, comments, analyses):
+        return score_comments(comments, self.vader, dedup=True)
+
+    def _analyze_llm(self, comments, analyses):
+        """Replace the VADER rows with the model's analysis wherever the model produced one."""
+        from llm import FAILED_SUMMARY
+
+        results = self.analyzer.analyze_comments([str(body) for body in comments['body']])
+        analyses = analyses.astype({'themes': object, 'summary': object})
+        for position, result in enumerate(results):
+            if not isinstance(result, dict) or result.get("summary") == FAILED_SUMMARY:
+                continue
+            for column in ('sentiment', 'sentiment_score', 'themes', 'summary'):
+                if column in result:
+                    analyses.at[position, column] = result[column]
+        return analyses
+
+    def _store(self, comments, analyses):
+        self.store.upsert_analyses(analyses)
+        if self.on_chunk is not None:
+            self.on_chunk(comments, analyses)
+        return analyses
+
+
+# Example usage
+if __name__ == "__main__":
+    pipeline = StreamingPipeline(RedditScraper("ClashRoyale"), ScrapeStore("clash_royale.sqlite"))
+    interval = os.getenv("PIPELINE_INTERVAL_SECONDS")
+    if interval:
+        pipeline.run_forever(int(interval), post_limit=25, comment_limit=None)
+    else:
+        for name, stage_stats in pipeline.run(post_limit=25, comment_limit=None).items():
+            print(f"{name}: {stage_stats}")
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """LRU cache of rendered JSON responses, keyed by (endpoint, params) for one data version.
+
+    Entries are only valid for the data version they were computed from; the first lookup with
+    a newer version drops everything. Each entry carries an ETag derived from the body, so
+    clients that already have the same body can be answered with 304 Not Modified.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (endpoint, params) -> (body, etag), least recently used first
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def get(self, version, endpoint, params):
+        """Return (body, etag) for a cached response, or None."""
+        key = (endpoint, tuple(sorted(params.items())))
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, endpoint, params, body):
+        """Store a rendered body and return (body, etag)."""
+        entry = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        with self.lock:
+            # A load finished while this response was computed; it is already stale
+            if version != self.version:
+                return entry
+            self.entries[(endpoint, tuple(sorted(params.items())))] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from columnar import write_table
+
+POST_COLUMNS = ['id', 'title', 'score', 'num_comments', 'created_utc', 'url', 'selftext', 'upvote_ratio']
+COMMENT_COLUMNS = ['id', 'post_id', 'parent_id', 'body', 'score', 'created_utc', 'depth']
+ANALYSIS_COLUMNS = ['comment_id', 'sentiment_score', 'sentiment', 'themes', 'summary']
+
+# SQLite limits the number of bound parameters per statement
+ID_CHUNK_SIZE = 900
+
+
+class ScrapeStore:
+    """Deduplicated SQLite store of scraped posts and comments, plus the cursors for incremental scraping.
+
+    Posts and comments are keyed by their Reddit id, so re-scraping the same thread updates rows
+    instead of adding copies. For every submission the store remembers how many comments it had,
+    the newest comment seen and when it was last scraped. Analyses of the stored comments can be
+    kept alongside them. The store can be shared between threads.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS posts (
+                id TEXT PRIMARY KEY, title TEXT, score INTEGER, num_comments INTEGER,
+                created_utc TEXT, url TEXT, selftext TEXT, upvote_ratio REAL
+            );
+            CREATE TABLE IF NOT EXISTS comments (
+                id TEXT PRIMARY KEY, post_id TEXT, parent_id TEXT, body TEXT,
+                score INTEGER, created_utc TEXT, depth INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS comments_post_id ON comments (post_id);
+            CREATE TABLE IF NOT EXISTS cursors (
+                post_id TEXT PRIMARY KEY, num_comments INTEGER, last_created_utc REAL, scraped_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS analyses (
+                comment_id TEXT PRIMARY KEY, sentiment_score REAL, sentiment TEXT, themes TEXT, summary TEXT
+            );
+        """)
+        self.db.commit()
+
+    def get_cursor(self, post_id):
+        """Return the stored cursor for a submission as a dict, or None if it was never scraped."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT num_comments, last_created_utc, scraped_at FROM cursors WHERE post_id = ?", (post_id,)).fetchone()
+        if row is None:
+            return None
+        return {"num_comments": row[0], "last_created_utc": row[1], "scraped_at": row[2]}
+
+    def seen_comment_ids(self, post_id):
+        with self.lock:
+            return {row[0] for row in self.db.execute("SELECT id FROM comments WHERE post_id = ?", (post_id,))}
+
+    def update_cursor(self, post_id, num_comments, last_created_utc, scraped_at=None):
+        with self.lock:
+            self.db.execute(
+                """INSERT INTO cursors (post_id, num_comments, last_created_utc, scraped_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(post_id) DO UPDATE SET
+                       num_comments = excluded.num_comments,
+                       last_created_utc = MAX(COALESCE(last_created_utc, 0), COALESCE(excluded.last_created_utc, 0)),
+                       scraped_at = excluded.scraped_at""",
+                (post_id, int(num_comments), last_created_utc, scraped_at or time.time()))
+            self.db.commit()
+
+    def upsert_posts(self, posts):
+        """Insert new posts and refresh the score and comment count of known ones."""
+        if posts.empty:
+            return
+        rows = self._sql_rows(posts, POST_COLUMNS)
+        with self.lock:
+            self.db.executemany(
+                f"""INSERT INTO posts ({', '.join(POST_COLUMNS)}) VALUES ({', '.join('?' * len(POST_COLUMNS))})
+                    ON CONFLICT(id) DO UPDATE SET
+                        title = excluded.title, score = excluded.score, num_comments = excluded.num_comments,
+                        selftext = excluded.selftext, upvote_ratio = excluded.upvote_ratio""",
+                rows)
+            self.db.commit()
+
+    def upsert_comments(self, comments):
+        """Add comments to the store and return the ones that were new or whose text changed.
+
+        Comments that are already stored with the same body only get their score refreshed,
+        so they don't come back for re-analysis.
+        """
+        if comments.empty:
+            return comments
+
+        # The same comment can show up twice in one scrape; the last copy wins
+        comments = comments.drop_duplicates('id', keep='last')
+        rows = self._sql_rows(comments, COMMENT_COLUMNS)
+        with self.lock:
+            stored_bodies = self._lookup("SELECT id, body FROM comments WHERE id IN ({})", comments['id'].tolist())
+            self.db.executemany(
+                f"""INSERT INTO comments ({', '.join(COMMENT_COLUMNS)}) VALUES ({', '.join('?' * len(COMMENT_COLUMNS))})
+                    ON CONFLICT(id) DO UPDATE SET body = excluded.body, score = excluded.score""",
+                rows)
+            self.db.commit()
+        return comments[[stored_bodies.get(comment_id) != body
+                         for comment_id, body in zip(comments['id'], comments['body'])]]
+
+    def upsert_analyses(self, analyses):
+        """Store analysis rows (comment_id, sentiment_score, sentiment, themes, summary), replacing older ones."""
+        if analyses.empty:
+            return
+        rows = analyses.reindex(columns=ANALYSIS_COLUMNS).astype(object)
+        rows = rows.where(rows.notna(), None)
+        # Themes are kept in the same text form as the sentiment files
+        rows['themes'] = rows['themes'].map(
+            lambda themes: json.dumps(themes) if isinstance(themes, list) else (themes or '[]'))
+        with self.lock:
+            self.db.executemany(
+                f"""INSERT OR REPLACE INTO analyses ({', '.join(ANALYSIS_COLUMNS)})
+                    VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})""",
+                list(rows.itertuples(index=False, name=None)))
+            self.db.commit()
+
+    def _lookup(self, query, ids):
+        """Run a two-column SELECT ... WHERE id IN (...) over ids in chunks and return it as a dict."""
+        found = {}
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start:start + ID_CHUNK_SIZE]
+            found.update(self.db.execute(query.format(', '.join('?' * len(chunk))), chunk))
+        return found
+
+    def _sql_rows(self, df, columns):
+        """Turn a DataFrame into tuples of plain Python values (None for missing, text timestamps)."""
+        rows = df.reindex(columns=columns).astype(object)
+        rows = rows.where(rows.notna(), None)
+        rows['created_utc'] = rows['created_utc'].map(lambda value: None if value is None else str(value))
+        return list(rows.itertuples(index=False, name=None))
+
+    def load_posts(self):
+        with self.lock:
+            return pd.read_sql_query("SELECT * FROM posts", self.db, parse_dates=['created_utc'])
+
+    def load_comments(self, ids=None):
+        """Load all stored comments, or only the ones with the given ids."""
+        with self.lock:
+            if ids is None:
+                return pd.read_sql_query("SELECT * FROM comments", self.db, parse_dates=['created_utc'])
+            parts = [pd.read_sql_query(f"SELECT * FROM comments WHERE id IN ({', '.join('?' * len(chunk))})",
+                                       self.db, params=chunk, parse_dates=['created_utc'])
+                     for chunk in (ids[start:start + ID_CHUNK_SIZE] for start in range(0, len(ids), ID_CHUNK_SIZE))]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=COMMENT_COLUMNS)
+
+    def unanalyzed_comment_ids(self):
+        """Ids of stored comments that have no analysis yet, e.g. because a pipeline run was interrupted."""
+        with self.lock:
+            return [row[0] for row in self.db.execute(
+                "SELECT id FROM comments WHERE id NOT IN (SELECT comment_id FROM analyses)")]
+
+    def load_analyses(self):
+        with self.lock:
+            return pd.read_sql_query("SELECT * FROM analyses", self.db)
+
+    def export(self, directory, extension="parquet"):
+        """Write posts, comments and analyses as columnar files that DataProcessor.load_data reads."""
+        paths = {kind: os.path.join(directory, f"{name}.{extension}")
+                 for kind, name in [("posts", "posts"), ("comments", "comments"), ("analysis", "sentiment")]}
+        write_table(self.load_posts(), paths["posts"], "posts")
+        write_table(self.load_comments(), paths["comments"], "comments")
+        write_table(self.load_analyses(), paths["analysis"], "analysis")
+        return paths
+
+    def comment_count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM comments").fetchone()[0]
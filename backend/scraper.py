@@ -1,27 +1,85 @@
 import praw
 import pandas as pd
 import datetime
+import math
 import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import time
+from columnar import write_table
+from scrape_store import ScrapeStore
 
 # Load environment variables
 load_dotenv()
 
+# Reddit allows 100 OAuth requests per minute per client id
+REDDIT_REQUESTS_PER_MINUTE = 100
+
+
+class TokenBucket:
+    """Thread-safe token bucket; each Reddit API request takes one token."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until the requested number of tokens is available, then take them."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
 class RedditScraper:
-    def __init__(self, subreddit_name):
-        """Initialize the Reddit scraper with credentials from environment variables."""
-        self.reddit = praw.Reddit(
+    def __init__(self, subreddit_name, max_workers=8, rate_limiter=None):
+        """Initialize the Reddit scraper with credentials from environment variables.
+
+        Submissions are fetched on up to max_workers threads. All requests go through
+        rate_limiter, which can be shared between scrapers using the same credentials.
+        """
+        self.subreddit_name = subreddit_name
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or TokenBucket(REDDIT_REQUESTS_PER_MINUTE / 60, capacity=10)
+        # PRAW isn't thread-safe, so every thread gets its own client
+        self._local = threading.local()
+        self.reddit = self._create_reddit()
+        self._local.reddit = self.reddit
+
+    def _create_reddit(self):
+        return praw.Reddit(
             client_id=os.getenv("REDDIT_CLIENT_ID"),
             client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
             user_agent=os.getenv("REDDIT_USER_AGENT", "GamePulse:v0.1 (by /u/YourUsername)")
         )
-        self.subreddit = self.reddit.subreddit(subreddit_name)
+
+    def _thread_reddit(self):
+        """Return the PRAW client owned by the calling thread."""
+        if not hasattr(self._local, "reddit"):
+            self._local.reddit = self._create_reddit()
+        return self._local.reddit
+
+    @property
+    def subreddit(self):
+        return self._thread_reddit().subreddit(self.subreddit_name)
     
     def get_hot_posts(self, limit=25):
         """Fetch hot posts from the subreddit."""
         posts_data = []
-        
+
+        # Listings are fetched in pages of up to 100 posts
+        self.rate_limiter.acquire(max(1, math.ceil((limit or 100) / 100)))
         for post in self.subreddit.hot(limit=limit):
             # Skip stickied posts (usually announcements)
             if post.stickied:
@@ -41,21 +99,41 @@ class RedditScraper:
             
         return pd.DataFrame(posts_data)
     
-    def get_post_comments(self, post_id, limit=None):
-        """Fetch comments for a specific post."""
+    def get_post_comments(self, post_id, limit=None, seen_ids=None, edited_since=None):
+        """Fetch comments for a specific post.
+
+        With seen_ids, comments already in that set are skipped unless they were edited after
+        edited_since (a Unix timestamp); limit then counts only the new or edited ones.
+        """
         comments_data = []
-        submission = self.reddit.submission(id=post_id)
+        submission = self._thread_reddit().submission(id=post_id)
+        if seen_ids is not None:
+            # Newest first, so the unseen comments are in the part of the tree that gets loaded
+            submission.comment_sort = "new"
+
+        # Loading the comment tree is one request
+        self.rate_limiter.acquire()
+        comments = submission.comments
         
-        # Replace "MoreComments" objects with actual comments
-        submission.comments.replace_more(limit=5)  # Limit to prevent excessive API calls
+        # Replace "MoreComments" objects with actual comments, one request each
+        for _ in range(5):  # Limit to prevent excessive API calls
+            self.rate_limiter.acquire()
+            if not comments.replace_more(limit=1):
+                break
         
-        comment_queue = list(submission.comments)
+        # Breadth-first walk over the already loaded tree; no requests happen here
+        comment_queue = deque(comments)
         while comment_queue and (limit is None or len(comments_data) < limit):
-            comment = comment_queue.pop(0)
+            comment = comment_queue.popleft()
             
             if not hasattr(comment, 'body'):  # Skip non-comment objects
                 continue
-                
+
+            # Replies are walked either way; a new reply can sit under an old comment
+            comment_queue.extend(comment.replies)
+            if seen_ids is not None and comment.id in seen_ids and not self._edited_since(comment, edited_since):
+                continue
+
             comment_data = {
                 'id': comment.id,
                 'parent_id': comment.parent_id,
@@ -65,52 +143,102 @@ class RedditScraper:
                 'depth': comment.depth
             }
             comments_data.append(comment_data)
-            
-            # Add replies to the queue
-            comment_queue.extend(comment.replies)
-            
-            # Avoid hitting rate limits
-            time.sleep(0.1)
-            
+
         return pd.DataFrame(comments_data)
-    
-    def get_recent_activity(self, post_limit=10, comment_limit=50):
-        """Get recent posts and their comments."""
+
+    @staticmethod
+    def _edited_since(comment, timestamp):
+        # PRAW reports edited as False or as the Unix time of the last edit
+        return bool(timestamp) and bool(comment.edited) and comment.edited > timestamp
+
+    def get_recent_activity(self, post_limit=10, comment_limit=50, store=None):
+        """Get recent posts and their comments.
+
+        With a ScrapeStore the run is incremental: submissions whose comment count hasn't changed
+        since the last run are skipped, only new or edited comments are fetched, everything is
+        upserted into the store and only the comments that were new or changed are returned.
+        """
         posts = self.get_hot_posts(limit=post_limit)
-        all_comments = []
-        
-        for post_id in posts['id']:
-            comments = self.get_post_comments(post_id, limit=comment_limit)
-            # Add post_id to link comments to posts
-            if not comments.empty:
-                comments['post_id'] = post_id
-                all_comments.append(comments)
-        
+        if posts.empty:
+            return posts, pd.DataFrame()
+
+        all_comments = [comments for _, comments in self.iter_post_comments(posts, comment_limit, store)
+                        if not comments.empty]
         if all_comments:
             all_comments_df = pd.concat(all_comments)
             return posts, all_comments_df
         else:
             return posts, pd.DataFrame()
-            
-    def save_data(self, posts, comments, base_filename):
-        """Save scraped data to CSV files."""
+
+    def iter_post_comments(self, posts, comment_limit=50, store=None):
+        """Yield (post_id, comments) for each post as soon as its comments are fetched.
+
+        See get_recent_activity for what happens when a store is given.
+        """
+        to_fetch = []
+        for post_id, num_comments in zip(posts['id'], posts['num_comments']):
+            if store is None:
+                to_fetch.append((post_id, None, None))
+                continue
+            cursor = store.get_cursor(post_id)
+            if cursor is None:
+                to_fetch.append((post_id, set(), None))
+            elif cursor['num_comments'] != num_comments:
+                to_fetch.append((post_id, store.seen_comment_ids(post_id), cursor['scraped_at']))
+        if store is not None:
+            store.upsert_posts(posts)
+            print(f"Skipping {len(posts) - len(to_fetch)} of {len(posts)} posts with no new comments")
+
+        # Submissions are fetched concurrently; the shared rate limiter keeps the total within quota.
+        # At most max_workers fetches are in flight, so a slow consumer holds back the scraping
+        # instead of letting fetched comments pile up in memory.
+        num_comments = dict(zip(posts['id'], posts['num_comments']))
+        tasks = iter(to_fetch)
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            scraped_at = time.time()
+            def submit_next():
+                task = next(tasks, None)
+                if task is not None:
+                    in_flight.append((task[0], executor.submit(
+                        self.get_post_comments, task[0], limit=comment_limit, seen_ids=task[1], edited_since=task[2])))
+
+            for _ in range(self.max_workers):
+                submit_next()
+            while in_flight:
+                post_id, future = in_flight.popleft()
+                comments = future.result()
+                # Add post_id to link comments to posts
+                if not comments.empty:
+                    comments['post_id'] = post_id
+                    if store is not None:
+                        comments = store.upsert_comments(comments)
+                if store is not None:
+                    # The cursor only moves once the comments are safely stored
+                    last_created = comments['created_utc'].max().timestamp() if not comments.empty else None
+                    store.update_cursor(post_id, num_comments[post_id], last_created, scraped_at)
+                yield post_id, comments
+                submit_next()
+
+    def save_data(self, posts, comments, base_filename, extension="parquet"):
+        """Save scraped data as typed Parquet (or Arrow IPC with extension="arrow") files."""
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        posts_filename = f"{base_filename}_posts_{timestamp}.csv"
-        comments_filename = f"{base_filename}_comments_{timestamp}.csv"
+        posts_filename = f"{base_filename}_posts_{timestamp}.{extension}"
+        comments_filename = f"{base_filename}_comments_{timestamp}.{extension}"
         
-        posts.to_csv(posts_filename, index=False)
-        comments.to_csv(comments_filename, index=False)
+        write_table(posts, posts_filename, "posts")
+        write_table(comments, comments_filename, "comments")
         
         return posts_filename, comments_filename
 
 # Example usage
 if __name__ == "__main__":
     scraper = RedditScraper("ClashRoyale")
-    posts, comments = scraper.get_recent_activity()
+    store = ScrapeStore("clash_royale.sqlite")
+    posts, comments = scraper.get_recent_activity(store=store)
     
     if not posts.empty:
-        print(f"Collected {len(posts)} posts and {len(comments)} comments")
-        posts_file, comments_file = scraper.save_data(posts, comments, "clash_royale")
-        print(f"Data saved to {posts_file} and {comments_file}")
+        print(f"Collected {len(posts)} posts and {len(comments)} new or edited comments")
+        print(f"clash_royale.sqlite now holds {store.comment_count()} comments")
     else:
         print("No data collected")
\ No newline at end of file
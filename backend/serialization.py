@@ -0,0 +1,86 @@
+import gzip
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it responses are only gzip-compressed
+    brotli = None
+
+# Response formats a client can pick with ?format=, and their media types
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+
+def encode(data, fmt="json"):
+    """Serialize an endpoint result as JSON, NDJSON (one record per line) or an Arrow IPC stream.
+
+    NaN and infinite floats come out as null: orjson writes them as null, and the Arrow path
+    masks them per column.
+    """
+    if fmt == "json":
+        return orjson.dumps(data, option=_ORJSON_OPTIONS)
+    records = _records(data)
+    if fmt == "ndjson":
+        return b"".join(orjson.dumps(record, option=_ORJSON_OPTIONS) + b"\n" for record in records)
+    if fmt == "arrow":
+        return _arrow_stream(records)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def _records(data):
+    """Lists are already records; a dict becomes one record per key."""
+    if isinstance(data, list):
+        return data
+    return [{"key": key, **value} if isinstance(value, dict) else {"key": key, "value": value}
+            for key, value in data.items()]
+
+
+def _arrow_stream(records):
+    df = pd.DataFrame.from_records(records)
+    for column in df.select_dtypes(include="floating").columns:
+        # from_pandas turns NaN into null; infinities have to be masked first
+        df[column] = df[column].where(np.isfinite(df[column]))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br (if available) or gzip from an Accept-Encoding header, or None for no compression."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    for encoding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        # Quality 5 is far faster than the default 11 and still smaller than gzip for JSON
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
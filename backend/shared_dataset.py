@@ -0,0 +1,134 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from columnar import convert_file
+
+MANIFEST = "manifest.json"
+
+# File names of the three datasets inside a version directory, as DataProcessor.load_data takes them
+DATASETS = [("posts", "posts"), ("comments", "comments"), ("analysis", "sentiment")]
+
+
+class SharedDataset:
+    """Dataset directory shared by every uvicorn worker, announced through a manifest.
+
+    A load in any worker converts the files to Arrow IPC in a new version directory and then
+    atomically replaces manifest.json; ingested batches are written the same way as delta files.
+    Every worker polls the manifest (see watch) and brings its own snapshot up to date: changed
+    sources are loaded from the Arrow files, which are memory-mapped, so their pages sit once in
+    the OS page cache for all workers instead of once per process. Deltas are appended in order.
+
+    Publishing is serialized across processes with a lock file. Directories no longer referenced
+    by the manifest are deleted; workers still reading them keep their mappings until they swap.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.sync_lock = threading.Lock()
+        self.synced = {}  # source -> (dataset paths loaded, number of deltas applied)
+        self.synced_version = 0
+        self.manifest_mtime = None
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "sources": {}}
+
+    @contextmanager
+    def _publishing(self):
+        """Hold the cross-process lock and yield the manifest to change; it is written when the block ends."""
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = self.read_manifest()
+            manifest["version"] += 1
+            yield manifest
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+            self._prune(manifest)
+
+    def _version_directory(self, version):
+        path = os.path.join(self.directory, f"v{version}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def publish_load(self, source, posts_file=None, comments_file=None, analysis_file=None):
+        """Publish a source's files as a new version, replacing its data and deltas; returns the version."""
+        with self._publishing() as manifest:
+            directory = self._version_directory(manifest["version"])
+            entry = {"deltas": []}
+            for (kind, name), path in zip(DATASETS, [posts_file, comments_file, analysis_file]):
+                if path:
+                    entry[kind] = os.path.join(directory, f"{source}-{name}.arrow")
+                    convert_file(path, entry[kind], kind)
+            manifest["sources"][source] = entry
+        return manifest["version"]
+
+    def publish_append(self, source, posts=None, comments=None, analysis=None):
+        """Publish a batch of rows (lists of dicts) to append to a source; returns the version."""
+        with self._publishing() as manifest:
+            path = os.path.join(self._version_directory(manifest["version"]), f"{source}-delta.json")
+            with open(path, "w") as f:
+                json.dump({"posts": posts, "comments": comments, "analysis": analysis}, f)
+            manifest["sources"].setdefault(source, {"deltas": []})["deltas"].append(path)
+        return manifest["version"]
+
+    def _prune(self, manifest):
+        referenced = {os.path.dirname(path) for entry in manifest["sources"].values()
+                      for path in [entry.get(kind) for kind, _ in DATASETS] + entry["deltas"] if path}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("v") and os.path.isdir(path) and path not in referenced:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def sync(self, snapshots, append):
+        """Load or append whatever the manifest has that this worker doesn't; returns the manifest version.
+
+        append(source, posts, comments, analysis) applies one delta to the worker's snapshot; a delta
+        it raises on is logged and counted as applied.
+        """
+        with self.sync_lock:
+            manifest = self.read_manifest()
+            if manifest["version"] == self.synced_version:
+                return self.synced_version
+            for source, entry in manifest["sources"].items():
+                paths = tuple(entry.get(kind) for kind, _ in DATASETS)
+                loaded, applied = self.synced.get(source, (None, 0))
+                if paths != loaded:
+                    if any(paths):
+                        snapshots.start_load(*paths, source=source).result()
+                    applied = 0
+                for path in entry["deltas"][applied:]:
+                    # A delta that can't be applied is skipped; retrying it would block every later change
+                    try:
+                        with open(path) as f:
+                            append(source, **json.load(f))
+                    except Exception as e:
+                        print(f"Skipping shared delta {path}: {e}")
+                self.synced[source] = (paths, len(entry["deltas"]))
+            self.synced_version = manifest["version"]
+            return self.synced_version
+
+    def watch(self, snapshots, append, interval_seconds=1.0):
+        """Sync every time the manifest changes; runs forever, so call it on a daemon thread."""
+        while True:
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self.manifest_mtime:
+                try:
+                    self.sync(snapshots, append)
+                    self.manifest_mtime = mtime
+                except Exception as e:
+                    print(f"Shared dataset sync failed: {e}")
+            time.sleep(interval_seconds)
@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import Future
+from dataprocess import DataProcessor
+from partitions import DEFAULT_SOURCE, PartitionedProcessor
+
+
+class LoadInProgressError(Exception):
+    """Raised when a load is requested while another one is still running."""
+
+
+class SnapshotManager:
+    """Holds the PartitionedProcessor snapshot that requests read, and swaps in new ones atomically.
+
+    Loading a source builds a complete new DataProcessor for it on a background thread; only then
+    is the `current` reference replaced, in a single assignment, by a PartitionedProcessor that
+    has the new partition and shares the others. Requests take `current` once and keep
+    using that snapshot until they finish, so they always see one consistent version. The old
+    snapshot is freed as soon as the last request holding it is done.
+
+    Small deltas are appended to the current snapshot in place with append(). That has to happen
+    on the event loop thread, where the request handlers run, so no handler sees half an append.
+    Deltas that arrive while a load is running are replayed onto the new snapshot before it is
+    published. `version` changes with every load and every append.
+    """
+
+    def __init__(self):
+        self.current = PartitionedProcessor()
+        self.version = 0
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.load_state = {"state": "idle"}
+        self.appended_during_load = []
+
+    def start_load(self, posts_file, comments_file, analysis_file=None, source=None):
+        """Start loading a source's data in the background and return a Future for the new version."""
+        source = source or DEFAULT_SOURCE
+        with self.lock:
+            if self.load_state["state"] == "loading":
+                raise LoadInProgressError("A data load is already in progress")
+            self.load_state = {"state": "loading", "source": source, "step": None, "progress": 0.0,
+                               "started_at": time.time()}
+            self.appended_during_load = []
+
+        future = Future()
+        threading.Thread(
+            target=self._load, args=(future, source, posts_file, comments_file, analysis_file),
+            name="snapshot-load", daemon=True).start()
+        return future
+
+    def _load(self, future, source, posts_file, comments_file, analysis_file):
+        started = time.perf_counter()
+        future.set_running_or_notify_cancel()
+
+        def progress(step):
+            self.load_state.update(
+                step=step, progress=round(DataProcessor.LOAD_STEPS.index(step) / len(DataProcessor.LOAD_STEPS), 2))
+
+        try:
+            snapshot = DataProcessor()
+            snapshot.load_data(posts_file, comments_file, analysis_file, progress=progress)
+            # load_data logs and skips files it can't read; a partial snapshot is never published
+            missing = [name for name, path, df in [("posts", posts_file, snapshot.posts_df),
+                                                   ("comments", comments_file, snapshot.comments_df),
+                                                   ("analysis", analysis_file, snapshot.analysis_df)]
+                       if path and df is None]
+            if missing:
+                raise ValueError(f"Could not load {', '.join(missing)} data")
+        except Exception as e:
+            with self.lock:
+                self.appended_during_load = []
+            self.load_state = {"state": "failed", "error": str(e), "version": self.version}
+            future.set_exception(e)
+            return
+
+        with self.lock:
+            # Appends to other sources went into partitions the new snapshot shares
+            for batch in self.appended_during_load:
+                if batch.pop("source") == source:
+                    snapshot.append_data(**batch)
+            self.appended_during_load = []
+            self.current = self.current.with_partition(source, snapshot)
+            self.version += 1
+            self.loaded_at = time.time()
+            self.load_state = {"state": "ready", "source": source, "version": self.version,
+                               "load_seconds": round(time.perf_counter() - started, 2)}
+        future.set_result(self.version)
+
+    def snapshot(self):
+        """Return (current snapshot, version) as one consistent pair."""
+        with self.lock:
+            return self.current, self.version
+
+    def append(self, posts=None, comments=None, analysis=None, source=None):
+        """Append new rows to a source in the current snapshot; returns the rows added and the new version."""
+        source = source or DEFAULT_SOURCE
+        with self.lock:
+            added = self.current.append_data(posts=posts, comments=comments, analysis=analysis, source=source)
+            if self.load_state["state"] == "loading":
+                self.appended_during_load.append(
+                    {"posts": posts, "comments": comments, "analysis": analysis, "source": source})
+            self.version += 1
+            return added, self.version
+
+    def stats(self):
+        """Published snapshot version and the state of the latest load."""
+        return {"version": self.version, "loaded_at": self.loaded_at, "load": dict(self.load_state)}
@@ -0,0 +1,16 @@
+import pandas as pd
+from columnar import read_table
+from vader_analysis import analyze_sentiment
+
+
+def test_analysis_written_in_several_chunks(tmp_path):
+    bodies = ["love this update", "this is awful", "it's a card game"]
+    comments = pd.DataFrame({"id": [f"c{i}" for i in range(3001)], "body": [bodies[i % 3] for i in range(3001)]})
+    comments.to_csv(tmp_path / "comments.csv", index=False)
+
+    for extension in ["arrow", "parquet"]:
+        output = str(tmp_path / f"sentiment.{extension}")
+        analyze_sentiment(str(tmp_path / "comments.csv"), output, workers=1, chunksize=700)
+        analysis = read_table(output)
+        assert analysis["comment_id"].tolist() == comments["id"].tolist()
+        assert analysis["sentiment"].astype(str).tolist()[:3] == ["positive", "negative", "neutral"]
@@ -0,0 +1,37 @@
+import pandas as pd
+from columnar import write_table
+from dataprocess import DataProcessor
+
+COMMENTS = [
+    {"id": "a", "body": "love the new card", "score": 3, "created_utc": "2025-05-17T10:05:00"},
+    {"id": "b", "body": "matchmaking is broken", "score": 8, "created_utc": "2025-05-17T10:40:00"},
+    {"id": "c", "body": "pay to win", "score": 5, "created_utc": "2025-05-18T09:00:00"},
+]
+ANALYSIS = [
+    {"comment_id": "a", "sentiment_score": 0.4926, "sentiment": "positive", "themes": "['game balance']"},
+    {"comment_id": "b", "sentiment_score": -0.2, "sentiment": "negative", "themes": "[]"},
+    {"comment_id": "c", "sentiment_score": -0.9, "sentiment": "negative", "themes": "['monetization']"},
+]
+
+
+def assert_exact_means(processor):
+    day = processor.get_sentiment_over_time('day')
+    assert [point["sentiment"] for point in day] == [(0.4926 + -0.2) / 2, -0.9]
+    hour = processor.get_sentiment_over_time('hour')
+    assert [point["sentiment"] for point in hour] == [(0.4926 + -0.2) / 2, -0.9]
+    assert processor.get_sentiment_over_time('day', theme='monetization')[0]["sentiment"] == -0.9
+
+
+def test_sentiment_over_time_means_are_exact_after_append():
+    processor = DataProcessor()
+    processor.append_data(comments=COMMENTS[:2], analysis=ANALYSIS[:2])
+    processor.append_data(comments=COMMENTS[2:], analysis=ANALYSIS[2:])
+    assert_exact_means(processor)
+
+
+def test_sentiment_over_time_means_are_exact_from_float32_files(tmp_path):
+    comments = pd.DataFrame(COMMENTS).assign(created_utc=lambda df: pd.to_datetime(df["created_utc"]))
+    write_table(comments, str(tmp_path / "comments.arrow"), "comments")
+    write_table(pd.DataFrame(ANALYSIS), str(tmp_path / "sentiment.arrow"), "analysis")
+    processor = DataProcessor(None, str(tmp_path / "comments.arrow"), str(tmp_path / "sentiment.arrow"))
+    assert_exact_means(processor)
@@ -0,0 +1,38 @@
+import pytest
+from dataprocess import DataProcessor
+from partitions import PartitionedProcessor
+
+
+def make_processor(count):
+    processor = DataProcessor()
+    processor.append_data(
+        comments=[{"id": f"c{i}", "body": f"comment {i}", "score": i % 7, "created_utc": "2025-05-17T00:00:00"}
+                  for i in range(count)],
+        analysis=[{"comment_id": f"c{i}", "sentiment_score": 0.1, "sentiment": "positive", "themes": "[]"}
+                  for i in range(count)])
+    return processor
+
+
+def test_paging_with_the_same_comment_ids_in_two_sources():
+    partitioned = PartitionedProcessor({"A": make_processor(40), "B": make_processor(40)})
+    full = partitioned.get_top_comments(limit=1000)
+    assert len(full) == 80
+
+    pages, after = [], None
+    while len(pages) <= len(full):
+        page = partitioned.get_top_comments(limit=9, after=after)
+        if not page:
+            break
+        pages += page
+        after = f"{page[-1]['score']},{page[-1]['source']},{page[-1]['id']}"
+    assert pages == full
+
+
+def test_cursor_without_source_only_for_one_source():
+    partitioned = PartitionedProcessor({"A": make_processor(5), "B": make_processor(5)})
+    first = partitioned.get_top_comments(limit=2, source="A")
+    after = f"{first[-1]['score']},{first[-1]['id']}"
+    assert partitioned.get_top_comments(limit=2, source="A", after=after)[0]["id"] != first[-1]["id"]
+    # Across sources the id alone is ambiguous
+    with pytest.raises(ValueError):
+        partitioned.get_top_comments(limit=2, after=after)
@@ -1,53 +1,114 @@
-import pandas as pd
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import ast
-
-def analyze_sentiment(comments_file, output_file):
-    # Load comments CSV
-    comments_df = pd.read_csv(comments_file)
-    
-    # Initialize VADER sentiment analyzer
-    analyzer = SentimentIntensityAnalyzer()
-    
-    # Prepare columns for analysis output
-    analysis_data = []
-    
-    for _, row in comments_df.iterrows():
-        comment_id = row['id']
-        body = str(row['body'])
-        
-        vs = analyzer.polarity_scores(body)
-        compound = vs['compound']
-        
-        # Determine sentiment category based on compound score
-        if compound >= 0.05:
-            sentiment = 'positive'
-        elif compound <= -0.05:
-            sentiment = 'negative'
-        else:
-            sentiment = 'neutral'
-        
-        # Fake 'themes' and 'summary' columns to avoid errors (you can customize later)
-        themes = []
-        summary = ""
-        
-        analysis_data.append({
-            'comment_id': comment_id,
-            'sentiment_score': compound,
-            'sentiment': sentiment,
-            'themes': str(themes),  # stored as string to match your backend expectations
-            'summary': summary
-        })
-    
-    # Convert to DataFrame
-    analysis_df = pd.DataFrame(analysis_data)
-    
-    # Save to CSV
-    analysis_df.to_csv(output_file, index=False)
-    print(f"Sentiment analysis saved to {output_file}")
-
-if __name__ == "__main__":
-    comments_csv = "clash_royale_comments_20250517_150746.csv"  # your comments file
-    output_csv = "clash_royale_sentiment_20250517_150746.csv"  # output analysis file
-    
-    analyze_sentiment(comments_csv, output_csv)
+import os
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from columnar import is_columnar, open_writer, to_arrow
+import ast
+
+# Comments handed to a worker process at a time
+SHARD_SIZE = 2000
+
+_worker_analyzer = None
+
+
+def _init_worker():
+    # Loading the VADER lexicon takes a moment, so every worker process does it once
+    global _worker_analyzer
+    _worker_analyzer = SentimentIntensityAnalyzer()
+
+
+def _score_shard(texts):
+    return [_worker_analyzer.polarity_scores(text)['compound'] for text in texts]
+
+
+def create_pool(workers=None):
+    """Process pool for compound_scores, one VADER analyzer per process."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker)
+
+
+def compound_scores(texts, analyzer=None, executor=None):
+    """VADER compound score of every text, sharded over the executor's processes when one is given."""
+    if executor is None:
+        analyzer = analyzer or SentimentIntensityAnalyzer()
+        return np.array([analyzer.polarity_scores(text)['compound'] for text in texts], dtype=float)
+
+    shards = [texts[start:start + SHARD_SIZE] for start in range(0, len(texts), SHARD_SIZE)]
+    scores = [score for shard in executor.map(_score_shard, shards) for score in shard]
+    return np.array(scores, dtype=float)
+
+
+def label_sentiment(compound):
+    """Map compound scores to positive / negative / neutral with the usual ±0.05 thresholds."""
+    compound = np.asarray(compound)
+    return np.select([compound >= 0.05, compound <= -0.05], ['positive', 'negative'], default='neutral')
+
+
+def score_comments(comments_df, analyzer=None, executor=None, dedup=False):
+    """Score a DataFrame of comments with VADER and return the analysis rows as a DataFrame.
+
+    With dedup, identical bodies (bot replies, copypasta, "GG") are scored once.
+    """
+    bodies = comments_df['body'].astype(str)
+    if dedup:
+        codes, unique_bodies = pd.factorize(bodies)
+        compound = compound_scores(list(unique_bodies), analyzer, executor)[codes]
+    else:
+        compound = compound_scores(bodies.tolist(), analyzer, executor)
+
+    return pd.DataFrame({
+        'comment_id': comments_df['id'].to_numpy(),
+        'sentiment_score': compound,
+        'sentiment': label_sentiment(compound),
+        # No themes or summary without the LLM; themes are stored as a string to match the backend
+        'themes': '[]',
+        'summary': ''
+    })
+
+
+def read_comment_chunks(comments_file, chunksize=100_000):
+    """Yield the id and body columns of a CSV, Parquet or Arrow IPC comments file in chunks of at most chunksize rows."""
+    if comments_file.endswith('.parquet'):
+        for batch in pq.ParquetFile(comments_file).iter_batches(batch_size=chunksize, columns=['id', 'body']):
+            yield batch.to_pandas()
+    elif is_columnar(comments_file):
+        # Arrow IPC files are memory-mapped, so slicing them reads nothing up front
+        table = feather.read_table(comments_file, columns=['id', 'body'], memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas()
+    else:
+        yield from pd.read_csv(comments_file, usecols=['id', 'body'], chunksize=chunksize)
+
+
+def analyze_sentiment(comments_file, output_file, workers=None, chunksize=100_000, dedup=True):
+    """Score a comments file chunk by chunk, so files larger than memory work.
+
+    The output is a CSV file, or a typed columnar file when output_file ends in .parquet/.arrow.
+    """
+    writer = open_writer(output_file, "analysis") if is_columnar(output_file) else None
+    first_chunk = True
+    with create_pool(workers) if workers != 1 else nullcontext() as executor:
+        for chunk in read_comment_chunks(comments_file, chunksize):
+            analysis_df = score_comments(chunk, executor=executor, dedup=dedup)
+            if writer is not None:
+                writer.write_table(to_arrow(analysis_df, "analysis"))
+            else:
+                analysis_df.to_csv(output_file, index=False, mode='w' if first_chunk else 'a', header=first_chunk)
+            first_chunk = False
+    if writer is not None:
+        if first_chunk:
+            writer.write_table(to_arrow(score_comments(pd.DataFrame({'id': [], 'body': []})), "analysis"))
+        writer.close()
+    elif first_chunk:
+        score_comments(pd.DataFrame({'id': [], 'body': []})).to_csv(output_file, index=False)
+    print(f"Sentiment analysis saved to {output_file}")
+
+
+if __name__ == "__main__":
+    comments_csv = "clash_royale_comments_20250517_150746.csv"  # your comments file
+    output_csv = "clash_royale_sentiment_20250517_150746.csv"  # output analysis file
+
+    analyze_sentiment(comments_csv, output_csv)
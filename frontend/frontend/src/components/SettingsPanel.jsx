@@ -26,7 +26,7 @@ function SettingsPanel({ onLoadData, loading }) {
             value={postsFile}
             onChange={(e) => setPostsFile(e.target.value)}
             className="form-control"
-            placeholder="e.g., data/posts.json"
+            placeholder="e.g., data/posts.parquet"
             required
           />
         </div>
@@ -38,7 +38,7 @@ function SettingsPanel({ onLoadData, loading }) {
             value={commentsFile}
             onChange={(e) => setCommentsFile(e.target.value)}
             className="form-control"
-            placeholder="e.g., data/comments.json"
+            placeholder="e.g., data/comments.parquet"
             required
           />
         </div>
@@ -50,7 +50,7 @@ function SettingsPanel({ onLoadData, loading }) {
             value={analysisFile}
             onChange={(e) => setAnalysisFile(e.target.value)}
             className="form-control"
-            placeholder="e.g., data/sentiment.json"
+            placeholder="e.g., data/sentiment.parquet"
             required
           />
         </div>